@@ -10,25 +10,41 @@ bl_info = {
 
 import bpy
 
+from . import client, events
+from .cache import payload_cache
 from .operator_connect import QGIS_OT_connect
 from .operator_update_layers import QGIS_OT_update_layers
 from .operator_import_layer import QGIS_OT_import_layer
-from .operator_snapshot import QGIS_OT_update_snapshot
+from .operator_import_layers import QGIS_OT_import_layers
+from .operator_remove_layer import QGIS_OT_remove_layer
+from .operator_sync_layer import QGIS_OT_sync_layer
+from .operator_snapshot import QGIS_OT_update_snapshot, pack_snapshot
+from .operator_snapshot_tiles import QGIS_OT_update_tiles
 from .operator_displacement_map import QGIS_OT_displacement_map
 
 from .properties import QGISLayerProperties, QGISProjectProperties
+from .preferences import QGISBlenderLinkPreferences, QGIS_OT_clear_cache, configure_cache
 from .panels import QGIS_PT_import_panel
 
 
 def register():
+    bpy.utils.register_class(QGISBlenderLinkPreferences)
+    bpy.utils.register_class(QGIS_OT_clear_cache)
+    configure_cache(bpy.context.preferences.addons[__package__].preferences)
     bpy.utils.register_class(QGISLayerProperties)
     bpy.utils.register_class(QGISProjectProperties)
     bpy.utils.register_class(QGIS_OT_connect)
     bpy.utils.register_class(QGIS_OT_update_layers)
     bpy.utils.register_class(QGIS_OT_import_layer)
+    bpy.utils.register_class(QGIS_OT_import_layers)
+    bpy.utils.register_class(QGIS_OT_remove_layer)
+    bpy.utils.register_class(QGIS_OT_sync_layer)
     bpy.utils.register_class(QGIS_PT_import_panel)
     bpy.utils.register_class(QGIS_OT_displacement_map)
     bpy.utils.register_class(QGIS_OT_update_snapshot)
+    bpy.app.handlers.save_pre.append(pack_snapshot)
+    bpy.app.handlers.load_post.append(events.restore_live)
+    bpy.utils.register_class(QGIS_OT_update_tiles)
 
     bpy.types.Scene.qgis_layers = bpy.props.CollectionProperty(type=QGISLayerProperties)
     bpy.types.Scene.qgis_project = bpy.props.CollectionProperty(type=QGISProjectProperties)
@@ -39,6 +55,64 @@ def register():
         default="http://localhost:8000",
         description="URL of the QGIS server"
     )
+    bpy.types.Scene.qgis_timeout = bpy.props.FloatProperty(
+        name="Timeout",
+        description="Seconds to wait for the QGIS server to connect or send more data",
+        default=30.0,
+        min=1.0,
+        max=3600.0
+    )
+    bpy.types.Scene.qgis_live = bpy.props.BoolProperty(
+        name="Live updates",
+        description="Follow the QGIS canvas and apply layer edits as QGIS announces them",
+        default=False,
+        update=events.update_live
+    )
+    bpy.types.Scene.qgis_show_timings = bpy.props.BoolProperty(
+        name="Request timings",
+        description="Show how long the latest requests to QGIS took",
+        default=False
+    )
+    bpy.types.Scene.qgis_snapshot_size = bpy.props.IntProperty(
+        name="Snapshot Size",
+        description="Long edge of map snapshots in pixels (0 uses the QGIS canvas size)",
+        default=0,
+        min=0,
+        max=16384
+    )
+    bpy.types.Scene.qgis_terrain_vertices = bpy.props.IntProperty(
+        name="Terrain Vertices",
+        description="Most vertices sampled from the elevation layer for the terrain mesh",
+        default=250000,
+        min=4,
+        max=16777216
+    )
+    bpy.types.Scene.qgis_terrain_resolution = bpy.props.FloatProperty(
+        name="Terrain Resolution",
+        description="Ground distance between terrain vertices in map units (0 spreads the vertex budget "
+                    "over the extent)",
+        default=0.0,
+        min=0.0
+    )
+    bpy.types.Scene.qgis_terrain_tolerance = bpy.props.FloatProperty(
+        name="Terrain Tolerance",
+        description="Merge terrain faces where the surface stays within this height error in map units "
+                    "(0 keeps the full grid)",
+        default=0.0,
+        min=0.0
+    )
+    bpy.types.Scene.qgis_snapshot_tiled = bpy.props.BoolProperty(
+        name="Tiled",
+        description="Texture the extent with map tiles at the resolution the camera needs instead of one snapshot",
+        default=False
+    )
+    bpy.types.Scene.qgis_tile_size = bpy.props.IntProperty(
+        name="Tile Size",
+        description="Side of each map tile in pixels",
+        default=1024,
+        min=256,
+        max=8192
+    )
     bpy.types.Scene.qgis_offset = bpy.props.FloatVectorProperty(
         name="QGIS Offset",
         description="Offset between QGIS map center and Blender view center",
@@ -48,21 +122,44 @@ def register():
 
 
 def unregister():
+    events.stop()
+    client.close_sessions()
+    payload_cache.flush()
     bpy.utils.unregister_class(QGIS_PT_import_panel)
     bpy.utils.unregister_class(QGIS_OT_displacement_map)
+    bpy.utils.unregister_class(QGIS_OT_sync_layer)
+    bpy.utils.unregister_class(QGIS_OT_remove_layer)
+    bpy.utils.unregister_class(QGIS_OT_import_layers)
     bpy.utils.unregister_class(QGIS_OT_import_layer)
     bpy.utils.unregister_class(QGIS_OT_update_layers)
     bpy.utils.unregister_class(QGIS_OT_connect)
     bpy.utils.unregister_class(QGISProjectProperties)
     bpy.utils.unregister_class(QGISLayerProperties)
+    bpy.utils.unregister_class(QGIS_OT_update_tiles)
     bpy.utils.unregister_class(QGIS_OT_update_snapshot)
+    if pack_snapshot in bpy.app.handlers.save_pre:
+        bpy.app.handlers.save_pre.remove(pack_snapshot)
+    if events.restore_live in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(events.restore_live)
 
     del bpy.types.Scene.qgis_layers
     del bpy.types.Scene.qgis_project
     del bpy.types.Scene.qgis_linked
     del bpy.types.Scene.qgis_server_url
+    del bpy.types.Scene.qgis_timeout
+    del bpy.types.Scene.qgis_live
+    del bpy.types.Scene.qgis_show_timings
     del bpy.types.Scene.qgis_offset
+    del bpy.types.Scene.qgis_snapshot_size
+    del bpy.types.Scene.qgis_snapshot_tiled
+    del bpy.types.Scene.qgis_tile_size
     del bpy.types.Scene.qgis_displacement
+    del bpy.types.Scene.qgis_terrain_vertices
+    del bpy.types.Scene.qgis_terrain_resolution
+    del bpy.types.Scene.qgis_terrain_tolerance
+
+    bpy.utils.unregister_class(QGIS_OT_clear_cache)
+    bpy.utils.unregister_class(QGISBlenderLinkPreferences)
 
 
 if __name__ == "__main__":
@@ -1,15 +1,95 @@
-from qgis.core import (QgsProject, QgsVectorLayer, QgsMapLayer, QgsWkbTypes, QgsSingleSymbolRenderer, QgsMarkerSymbol, QgsLineSymbol,
+from qgis.core import (Qgis, QgsProject, QgsVectorLayer, QgsMapLayer, QgsWkbTypes, QgsSingleSymbolRenderer, QgsMarkerSymbol, QgsLineSymbol,
                        QgsFillSymbol, QgsCoordinateReferenceSystem, QgsRasterLayer, QgsRasterDataProvider,
-                       QgsMapSettings, QgsMapRendererCustomPainterJob, QgsUnitTypes)
+                       QgsMapSettings, QgsMapRendererParallelJob, QgsUnitTypes, QgsGeometryCollection,
+                       QgsCurvePolygon, QgsLineString, QgsPoint, QgsFeatureRequest, QgsRectangle,
+                       QgsCoordinateTransform, QgsExpression, QgsApplication, QgsRasterProjector)
 from qgis.PyQt.QtWidgets import QAction
-from qgis.PyQt.QtGui import QImage, QPainter
-from qgis.PyQt.QtCore import QSize, QBuffer, QByteArray
+from qgis.PyQt.QtGui import QImage
+from qgis.PyQt.QtCore import QSize, QBuffer, QByteArray, QVariant, QTimer
 from qgis.utils import iface
-import json, base64, threading
+import json, base64, threading, struct, sys, hashlib, uuid, time, zlib, queue
+from array import array
+from collections import OrderedDict, deque
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qsl, unquote
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Server configuration: bind address, port, number of requests handled at once and how long (in
+# seconds) an idle keep-alive connection is kept open; idle connections do not take a worker
+SERVER_HOST = ''
+SERVER_PORT = 8000
+SERVER_WORKERS = 8
+KEEP_ALIVE_TIMEOUT = 30
+# Streamed responses are flushed to the client in chunks of roughly this many bytes
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Binary columnar layer payload: magic, uint32 header length, JSON header, 8-byte aligned buffers
+BINARY_MAGIC = b'BLNK'
+BINARY_CONTENT_TYPE = 'application/vnd.blenderlink.columnar'
+
+# Response compression, negotiated through Accept-Encoding; zstd is offered when zstandard is installed
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+COMPRESSION_MIN_SIZE = 1024
+
+# Raw snapshot endpoints and the largest image side they will render
+SNAPSHOT_FORMATS = {
+    '/snapshot.png': ('PNG', 'image/png'),
+    '/snapshot.tif': ('TIFF', 'image/tiff'),
+    '/snapshot.exr': ('EXR', 'image/x-exr'),
+    '/snapshot.rgba': ('RGBA', 'application/vnd.blenderlink.rgba'),
+}
+SNAPSHOT_MAX_SIZE = 16384
+# Map tiles: zoom z splits the requested extent into 2^z x 2^z tiles of TILE_SIZE pixels by default
+TILE_SIZE = 1024
+TILE_MAX_ZOOM = 8
+
+# Raster band export: largest grid side, default rows per streamed tile and provider resampling methods
+RASTER_MAX_SIZE = 32768
+RASTER_TILE_ROWS = 256
+RASTER_CONTENT_TYPE = 'application/vnd.blenderlink.raster'
+RASTER_RESAMPLING = {
+    'nearest': QgsRasterDataProvider.ResamplingMethod.Nearest,
+    'bilinear': QgsRasterDataProvider.ResamplingMethod.Bilinear,
+    'cubic': QgsRasterDataProvider.ResamplingMethod.Cubic,
+}
+
+# Upper bound (in bytes) of the layer response cache
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Part of every ETag, so tags issued before a server restart never match
+SERVER_SESSION = uuid.uuid4().hex
+# Feature edits remembered per layer for /layer/<id>/changes; older revisions need a full reload
+JOURNAL_MAX_ENTRIES = 100000
+
+# /events stream: quiet time (ms) before a burst of changes is announced, seconds between keep-alive
+# comments, and events held for a slow subscriber before its oldest are dropped
+EVENTS_DEBOUNCE_MS = 250
+EVENTS_KEEPALIVE = 15
+EVENTS_QUEUE_SIZE = 256
+
+
+class BlenderLinkServer(ThreadingMixIn, HTTPServer):
+    """HTTP server with a cheap thread per connection and at most ``workers`` requests handled at once.
+
+    Waiting for the next request on a keep-alive connection holds no worker slot, so idle
+    connections never delay requests on other connections.
+    """
+    daemon_threads = True
+
+    def __init__(self, server_address, handler_class, workers=SERVER_WORKERS):
+        super().__init__(server_address, handler_class)
+        self.request_slots = threading.BoundedSemaphore(workers)
 
 
 class BlenderLinkRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEP_ALIVE_TIMEOUT
+
     routes = {
         '/project_info': lambda: get_project_info(),
         '/layers': lambda: get_layers_info(),
@@ -18,38 +98,680 @@ class BlenderLinkRequestHandler(BaseHTTPRequestHandler):
     }
 
     def do_GET(self):
-        if self.path in self.routes:
-            self.send_json_response(self.routes[self.path]())
-        elif self.path.startswith('/layer/'):
-            self.send_json_response(export_layer_data(self.path.split('/')[-1]))
-        elif self.path.startswith('/layerstyle/'):
-            self.send_json_response(export_layer_style(self.path.split('/')[-1]))
+        url = urlparse(self.path)
+        path, params = url.path, dict(parse_qsl(url.query))
+        if path == '/events':
+            # Streams stay open for as long as the client listens, on their own connection thread
+            self.send_events()
+            return
+        with self.server.request_slots:
+            self.route(path, params)
+
+    def route(self, path, params):
+        if path in self.routes:
+            self.send_json_response(self.routes[path]())
+        elif path in SNAPSHOT_FORMATS:
+            self.send_snapshot(path, params)
+        elif path.startswith('/tile/'):
+            self.send_tile(path, params)
+        elif path.startswith('/layer/') and path.endswith('/changes'):
+            self.send_layer_changes(unquote(path.split('/')[-2]), params)
+        elif path.startswith('/layer/'):
+            self.send_layer(unquote(path.split('/')[-1]), params)
+        elif path.startswith('/raster/'):
+            self.send_raster(unquote(path.split('/')[-1]), params)
+        elif path.startswith('/layerstyle/'):
+            layer_id = unquote(path.split('/')[-1])
+            self.send_cached('layerstyle', layer_id, params, 'application/json',
+                             lambda: json.dumps(export_layer_style(layer_id)).encode())
         else:
             self.send_error(404)
 
+    def send_snapshot(self, path, params):
+        try:
+            settings = map_settings(params)
+        except ValueError as e:
+            self.send_json_response({"error": str(e)})
+            return
+        headers = map_headers(path, settings)
+        if self.is_not_modified(headers):
+            return
+        image = render_map(settings)
+        image_format, content_type = SNAPSHOT_FORMATS[path]
+        if image_format == 'EXR':
+            self.send_chunked_response(content_type, iter_exr(image), headers)
+        elif image_format == 'RGBA':
+            self.send_chunked_response(content_type, iter_rgba(image), headers)
+        else:
+            self.send_bytes_response(encode_image(image, image_format), content_type, headers, compressible=False)
+
+    def send_tile(self, path, params):
+        # /tile/<zoom>/<x>/<y>.<format>, x from the left and y from the bottom of the extent
+        name, _, suffix = path.rpartition('.')
+        formats = SNAPSHOT_FORMATS.get(f'/snapshot.{suffix}')
+        try:
+            parts = name.split('/')[2:]
+            if len(parts) != 3 or not all(part.isdigit() for part in parts):
+                raise ValueError("Tiles are addressed as /tile/<zoom>/<x>/<y>.<format>")
+            zoom, x, y = (int(part) for part in parts)
+            if not formats:
+                raise ValueError(f"Unsupported tile format: {suffix}")
+            settings = map_settings(tile_render_params(zoom, x, y, params))
+        except ValueError as e:
+            self.send_json_response({"error": str(e)})
+            return
+        headers = map_headers(path, settings)
+        if self.is_not_modified(headers):
+            return
+        image = render_map(settings)
+        image_format, content_type = formats
+        if image_format == 'EXR':
+            self.send_chunked_response(content_type, iter_exr(image), headers)
+        elif image_format == 'RGBA':
+            self.send_chunked_response(content_type, iter_rgba(image), headers)
+        else:
+            self.send_bytes_response(encode_image(image, image_format), content_type, headers, compressible=False)
+
+    def send_raster(self, layer_id, params):
+        layer = QgsProject.instance().mapLayer(layer_id)
+        if not layer or layer.type() != QgsMapLayer.RasterLayer:
+            self.send_json_response({"error": "Raster layer not found"})
+            return
+        headers = self.revision_headers('raster', layer_id, params)
+        if self.is_not_modified(headers):
+            return
+        try:
+            window = RasterWindow(layer, params)
+        except ValueError as e:
+            self.send_json_response({"error": str(e)})
+            return
+        self.send_chunked_response(RASTER_CONTENT_TYPE, window.iter_payload(), headers)
+
+    def send_layer(self, layer_id, params):
+        layer = QgsProject.instance().mapLayer(layer_id)
+        if not layer or layer.type() != QgsMapLayer.VectorLayer:
+            self.send_json_response(export_layer_data(layer_id))
+            return
+
+        data_format = params.get('format', 'json')
+        try:
+            if data_format == 'json':
+                self.send_cached('layer', layer_id, params, 'application/json',
+                                 lambda: json.dumps(export_layer_data(layer_id, FeaturePage(layer, params))).encode())
+            elif data_format == 'ndjson':
+                headers = self.revision_headers('layer', layer_id, params)
+                if not self.is_not_modified(headers):
+                    page = FeaturePage(layer, params)
+                    self.send_chunked_response('application/x-ndjson', iter_features_ndjson(layer, page),
+                                               {**headers, **page.headers()})
+                    if page.tolerance:
+                        self.log_message('"%s" simplified %d -> %d vertices', self.path, page.vertices_in,
+                                         page.vertices_out)
+            elif data_format == 'binary':
+                self.send_cached('layer', layer_id, params, BINARY_CONTENT_TYPE,
+                                 lambda: export_layer_binary(layer, FeaturePage(layer, params)))
+            else:
+                self.send_json_response({"error": f"Unsupported format: {data_format}"})
+        except ValueError as e:
+            self.send_json_response({"error": str(e)})
+
+    def send_events(self):
+        # Server-Sent Events, one HTTP chunk per event so clients see each one as soon as it is written
+        subscription = event_hub.subscribe()
+        self.send_response(200)
+        self.send_header('Content-type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.close_connection = True
+        try:
+            self.write_chunk(format_event('session', {'session': SERVER_SESSION}))
+            while True:
+                try:
+                    message = subscription.get(timeout=EVENTS_KEEPALIVE)
+                except queue.Empty:
+                    message = b': keep-alive\n\n'
+                if message is None:
+                    self.wfile.write(b'0\r\n\r\n')
+                    break
+                self.write_chunk(message)
+        except OSError:
+            pass
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    def send_layer_changes(self, layer_id, params):
+        layer = QgsProject.instance().mapLayer(layer_id)
+        if not layer or layer.type() != QgsMapLayer.VectorLayer:
+            self.send_json_response({"error": "Vector layer not found"})
+            return
+        try:
+            since = int(params.pop('since'))
+        except (KeyError, ValueError):
+            self.send_json_response({"error": "since must be a layer revision"})
+            return
+        session = params.pop('session', SERVER_SESSION)
+        for name in ('offset', 'limit'):
+            params.pop(name, None)
+
+        revision, changed = layer_changes(layer_id, since)
+        if session != SERVER_SESSION:
+            changed = None
+        try:
+            page = FeaturePage(layer, params, changed or set())
+        except ValueError as e:
+            self.send_json_response({"error": str(e)})
+            return
+        # The ETag a full export with the same parameters would carry at this revision
+        delta = {'revision': revision, 'session': SERVER_SESSION, 'reset': changed is None,
+                 'etag': response_etag('layer', layer_id, revision, {**params, 'format': 'binary'})}
+        self.send_bytes_response(export_layer_binary(layer, page, lambda feature_ids: {
+            **delta, 'deleted': sorted((changed or set()) - set(feature_ids))}), BINARY_CONTENT_TYPE)
+
+    def revision_headers(self, kind, layer_id, params):
+        revision = layer_revision(layer_id)
+        return {'ETag': response_etag(kind, layer_id, revision, params), 'X-Layer-Revision': str(revision),
+                'X-Server-Session': SERVER_SESSION}
+
+    def is_not_modified(self, headers):
+        # Answer a conditional GET with 304 when the client already holds the current ETag
+        tags = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+        if headers['ETag'] not in tags and '*' not in tags:
+            return False
+        self.send_response(304)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        return True
+
+    def send_cached(self, kind, layer_id, params, content_type, build):
+        headers = self.revision_headers(kind, layer_id, params)
+        if self.is_not_modified(headers):
+            return
+        # Bodies are cached already compressed, once per content coding
+        encoding = self.content_encoding()
+        cache_key = f"{headers['ETag']}:{encoding}"
+        body = response_cache.get(cache_key)
+        if body is None:
+            body = build()
+            if encoding:
+                body = self.compress(body, encoding)
+            response_cache.put(cache_key, body)
+        self.write_response(body, content_type, headers, encoding)
+
     def send_json_response(self, data):
+        self.send_bytes_response(json.dumps(data).encode(), 'application/json')
+
+    def send_bytes_response(self, body, content_type, headers=None, compressible=True):
+        encoding = self.content_encoding() if compressible and len(body) >= COMPRESSION_MIN_SIZE else None
+        if encoding:
+            body = self.compress(body, encoding)
+        self.write_response(body, content_type, headers, encoding)
+
+    def write_response(self, body, content_type, headers, encoding):
         self.send_response(200)
-        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode())
+        self.wfile.write(body)
+
+    def content_encoding(self):
+        accepted = {}
+        for item in self.headers.get('Accept-Encoding', '').split(','):
+            name, *options = [part.strip() for part in item.split(';')]
+            quality = next((option[2:] for option in options if option.startswith('q=')), '1')
+            try:
+                accepted[name.lower()] = float(quality)
+            except ValueError:
+                continue
+        if zstandard and accepted.get('zstd', 0) > 0:
+            return 'zstd'
+        if accepted.get('gzip', 0) > 0:
+            return 'gzip'
+        return None
+
+    def compress(self, body, encoding):
+        started = time.perf_counter()
+        compressor = new_compressor(encoding)
+        compressed = compressor.compress(body) + compressor.flush()
+        self.log_compression(encoding, len(body), len(compressed), started)
+        return compressed
+
+    def log_compression(self, encoding, size, compressed_size, started):
+        self.log_message('"%s" %s %d -> %d bytes (%.1fx) in %.1f ms', self.path, encoding, size, compressed_size,
+                         size / max(compressed_size, 1), (time.perf_counter() - started) * 1000)
+
+    def send_chunked_response(self, content_type, chunks, headers=None):
+        encoding = self.content_encoding()
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        compressor = new_compressor(encoding) if encoding else None
+        started, size, compressed_size = time.perf_counter(), 0, 0
+        buffer = bytearray()
+        try:
+            for chunk in chunks:
+                buffer += chunk
+                if len(buffer) >= STREAM_CHUNK_SIZE:
+                    size += len(buffer)
+                    compressed_size += self.write_chunk(compressor.compress(bytes(buffer)) if compressor else buffer)
+                    buffer.clear()
+            size += len(buffer)
+            if compressor:
+                compressed_size += self.write_chunk(compressor.compress(bytes(buffer)) + compressor.flush())
+                self.log_compression(encoding, size, compressed_size, started)
+            elif buffer:
+                self.write_chunk(buffer)
+            self.wfile.write(b'0\r\n\r\n')
+        except Exception as e:
+            # The status line is already out, so the only way to signal failure is to drop the connection
+            self.log_error("Streaming %s failed: %s", self.path, e)
+            self.close_connection = True
+
+    def write_chunk(self, data):
+        # An empty chunk would terminate the response, so compressors' empty outputs are skipped
+        if data:
+            self.wfile.write(b'%X\r\n' % len(data))
+            self.wfile.write(data)
+            self.wfile.write(b'\r\n')
+        return len(data)
+
+
+def new_compressor(encoding):
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+class ResponseCache:
+    """Least recently used cache of response bodies keyed by ETag, bounded by total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class ChangeJournal:
+    """Ids of the features touched by each layer revision, keeping the last max_entries per layer.
+
+    Changes since a revision can be answered as long as no entry after it has been dropped and the
+    layer has not been reset (schema or subset change) since.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = {}
+        self.horizon = {}
+
+    def record(self, layer_id, revision, fids):
+        entries = self.entries.setdefault(layer_id, deque())
+        entries.extend((revision, fid) for fid in fids)
+        while len(entries) > self.max_entries:
+            dropped, _ = entries.popleft()
+            self.horizon[layer_id] = dropped
+
+    def reset(self, layer_id, revision):
+        self.entries.pop(layer_id, None)
+        self.horizon[layer_id] = revision
+
+    def changed_since(self, layer_id, since):
+        if since < self.horizon.get(layer_id, 0):
+            return None
+        return {fid for revision, fid in self.entries.get(layer_id, ()) if revision > since}
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class EventHub:
+    """Fans events out to the /events subscribers, each through its own bounded queue.
+
+    debounce() must be called on the main thread: it restarts a Qt timer per key, so a burst of
+    signals (a canvas pan, a batch of edits) is announced once, when it has been quiet for
+    EVENTS_DEBOUNCE_MS, with the state at that moment.
+    """
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self.subscribers = set()
+        self.timers = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = queue.Queue(self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def publish(self, event, data):
+        self.broadcast(format_event(event, data))
+
+    def close(self):
+        # Ends every stream, so worker threads are free when QGIS quits
+        self.broadcast(None)
+
+    def broadcast(self, message):
+        with self.lock:
+            for subscription in self.subscribers:
+                # A slow subscriber loses its oldest events rather than holding up QGIS
+                if subscription.full():
+                    try:
+                        subscription.get_nowait()
+                    except queue.Empty:
+                        pass
+                subscription.put_nowait(message)
+
+    def debounce(self, key, event, build):
+        if not self.subscribers:
+            return
+        timer = self.timers.get(key)
+        if timer is None:
+            timer = self.timers[key] = QTimer()
+            timer.setSingleShot(True)
+            timer.setInterval(EVENTS_DEBOUNCE_MS)
+            timer.timeout.connect(lambda: self.publish(event, build()))
+        timer.start()
+
+
+response_cache = ResponseCache(CACHE_MAX_BYTES)
+change_journal = ChangeJournal(JOURNAL_MAX_ENTRIES)
+event_hub = EventHub(EVENTS_QUEUE_SIZE)
+layer_revisions = {}
+revisions_lock = threading.Lock()
+
+
+def layer_revision(layer_id):
+    with revisions_lock:
+        return layer_revisions.get(layer_id, 0)
+
+
+def bump_layer_revision(layer_id, fids=None, reset=False):
+    # Feature edits pass the ids they touched; changes the journal cannot describe pass reset
+    with revisions_lock:
+        revision = layer_revisions[layer_id] = layer_revisions.get(layer_id, 0) + 1
+        if reset:
+            change_journal.reset(layer_id, revision)
+        elif fids:
+            change_journal.record(layer_id, revision, fids)
+    event_hub.debounce(f'revision:{layer_id}', 'revision',
+                       lambda: {'layer_id': layer_id, 'revision': layer_revision(layer_id)})
+
+
+def layer_changes(layer_id, since):
+    # Current revision and the ids of the features changed after since, or None when that is unknown
+    with revisions_lock:
+        revision = layer_revisions.get(layer_id, 0)
+        if since > revision:
+            return revision, None
+        return revision, change_journal.changed_since(layer_id, since)
+
+
+def response_etag(kind, layer_id, revision, params):
+    # bbox and extent are read in the project CRS, and lod=auto depends on the canvas scale
+    key = json.dumps([SERVER_SESSION, kind, layer_id, revision, sorted(params.items()),
+                      QgsProject.instance().crs().authid(), resolved_tolerance(layer_id, params)])
+    return '"%s"' % hashlib.sha1(key.encode()).hexdigest()
+
+
+def resolved_tolerance(layer_id, params):
+    if params.get('lod') != 'auto':
+        return None
+    layer = QgsProject.instance().mapLayer(layer_id)
+    if not layer or layer.type() != QgsMapLayer.VectorLayer:
+        return None
+    try:
+        return simplification_tolerance(layer, params)
+    except ValueError:
+        # The request itself reports the invalid parameter
+        return None
+
+
+def watch_layer(layer):
+    # Any data or style change invalidates cached responses and ETags for the layer; feature edits are
+    # journaled, including ids assigned on commit, while changes that feature ids cannot describe
+    # (schema, subset, provider reloads and new data sources) reset the journal
+    layer_id = layer.id()
+    for signal in (layer.styleChanged, layer.rendererChanged):
+        signal.connect(lambda *args: bump_layer_revision(layer_id))
+    layer.nameChanged.connect(announce_layers)
+    if layer.type() != QgsMapLayer.VectorLayer:
+        layer.dataChanged.connect(lambda *args: bump_layer_revision(layer_id))
+        return
+
+    # layer.reload(), a changed file or edits made by the provider itself surface as provider dataChanged
+    def watch_provider():
+        provider = layer.dataProvider()
+        if provider:
+            provider.dataChanged.connect(lambda *args: bump_layer_revision(layer_id, reset=True))
+
+    watch_provider()
+    layer.dataSourceChanged.connect(lambda *args: (watch_provider(), bump_layer_revision(layer_id, reset=True)))
+    for signal in (layer.featureAdded, layer.featureDeleted, layer.geometryChanged, layer.attributeValueChanged):
+        signal.connect(lambda fid, *args: bump_layer_revision(layer_id, [fid]))
+    layer.committedFeaturesAdded.connect(
+        lambda _, features: bump_layer_revision(layer_id, [feature.id() for feature in features]))
+    for signal in (layer.attributeAdded, layer.attributeDeleted, layer.subsetStringChanged):
+        signal.connect(lambda *args: bump_layer_revision(layer_id, reset=True))
+
+
+def watch_project():
+    project = QgsProject.instance()
+    for layer in project.mapLayers().values():
+        watch_layer(layer)
+    project.layerWasAdded.connect(watch_layer)
+    project.layersAdded.connect(announce_layers)
+    project.layersRemoved.connect(announce_layers)
+    canvas = iface.mapCanvas()
+    for signal in (canvas.extentsChanged, canvas.destinationCrsChanged):
+        signal.connect(lambda: event_hub.debounce('project', 'project', get_project_info))
+    QgsApplication.instance().aboutToQuit.connect(event_hub.close)
+
+
+def announce_layers(*args):
+    event_hub.debounce('layers', 'layers', get_layers_info)
 
 
 def get_map_snapshot():
+    img = render_map(map_settings({}))
+    img_str = base64.b64encode(encode_image(img, "PNG")).decode()
+    return {'image': img_str, 'width': img.width(), 'height': img.height()}
+
+
+def map_settings(params):
+    # Settings rendering the canvas layers; extent is "xmin,ymin,xmax,ymax" in project CRS (default: the
+    # canvas extent), and a missing width or height follows from the extent's aspect ratio
     canvas = iface.mapCanvas()
-    img = QImage(QSize(canvas.width(), canvas.height()), QImage.Format_ARGB32)
-    img.fill(0)
-    painter = QPainter(img)
-    job = QgsMapRendererCustomPainterJob(canvas.mapSettings(), painter)
+    extent = parse_rectangle(params['extent'], 'extent') if params.get('extent') else canvas.extent()
+    if extent.width() <= 0 or extent.height() <= 0:
+        raise ValueError("Empty extent")
+    width, height = output_size(params, extent, canvas.width(), SNAPSHOT_MAX_SIZE)
+    try:
+        dpi = float(params['dpi']) if params.get('dpi') else None
+    except ValueError:
+        raise ValueError("dpi must be a number")
+
+    settings = QgsMapSettings(canvas.mapSettings())
+    settings.setOutputSize(QSize(width, height))
+    settings.setExtent(extent)
+    if dpi:
+        settings.setOutputDpi(dpi)
+    return settings
+
+
+def render_map(settings):
+    # Renders with one thread per layer
+    job = QgsMapRendererParallelJob(settings)
     job.start()
     job.waitForFinished()
-    painter.end()
+    return job.renderedImage()
+
+
+def tile_render_params(zoom, x, y, params):
+    # map_settings parameters of one tile of the extent (default: the canvas extent)
+    if not 0 <= zoom <= TILE_MAX_ZOOM:
+        raise ValueError(f"zoom must be between 0 and {TILE_MAX_ZOOM}")
+    tiles = 1 << zoom
+    if not (0 <= x < tiles and 0 <= y < tiles):
+        raise ValueError(f"Tile {x},{y} is outside zoom level {zoom}")
+    extent = parse_rectangle(params['extent'], 'extent') if params.get('extent') else iface.mapCanvas().extent()
+    try:
+        size = int(params.get('size', TILE_SIZE))
+    except ValueError:
+        raise ValueError("size must be an integer")
+    if not 0 < size <= SNAPSHOT_MAX_SIZE:
+        raise ValueError(f"Tile size must be between 1 and {SNAPSHOT_MAX_SIZE} pixels")
+    width, height = extent.width() / tiles, extent.height() / tiles
+    xmin, ymin = extent.xMinimum() + x * width, extent.yMinimum() + y * height
+    tile_params = {'extent': f'{xmin},{ymin},{xmin + width},{ymin + height}', 'width': str(size),
+                   'height': str(size)}
+    if params.get('dpi'):
+        tile_params['dpi'] = params['dpi']
+    return tile_params
+
+
+def map_headers(path, settings):
+    # ETag and size of a rendered map image; it changes with the revision of any canvas layer, the layer
+    # set, the map CRS, extent, size and dpi
+    with revisions_lock:
+        layers = [(layer.id(), layer_revisions.get(layer.id(), 0)) for layer in settings.layers()]
+    extent, size = settings.extent(), settings.outputSize()
+    key = json.dumps([SERVER_SESSION, path, layers, settings.destinationCrs().authid(),
+                      [extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()],
+                      size.width(), size.height(), settings.outputDpi()])
+    return {'ETag': '"%s"' % hashlib.sha1(key.encode()).hexdigest(), 'X-Image-Width': str(size.width()),
+            'X-Image-Height': str(size.height())}
+
 
+def output_size(params, extent, default_width, max_size):
+    # A missing width or height follows from the extent's aspect ratio
+    try:
+        width, height = int(params.get('width', 0)), int(params.get('height', 0))
+    except ValueError:
+        raise ValueError("width and height must be integers")
+    aspect = extent.width() / extent.height()
+    if not width and not height:
+        width = default_width
+    width = width or max(1, round(height * aspect))
+    height = height or max(1, round(width / aspect))
+    if not (0 < width <= max_size and 0 < height <= max_size):
+        raise ValueError(f"Output size must be between 1 and {max_size} pixels per side")
+    return width, height
+
+
+def encode_image(img, image_format):
     buffer = QBuffer()
     buffer.open(QBuffer.WriteOnly)
-    img.save(buffer, "PNG")
-    img_str = base64.b64encode(buffer.data()).decode()
+    if not img.save(buffer, image_format):
+        raise ValueError(f"{image_format} images are not supported by this QGIS installation")
+    return bytes(buffer.data())
+
+
+def srgb_to_linear(value):
+    return value / 12.92 if value <= 0.04045 else ((value + 0.055) / 1.055) ** 2.4
+
+
+def half_float_tables(convert):
+    # bytes.translate() tables giving the low and high byte of the half float for each 8-bit value
+    halves = [struct.pack('<e', convert(i / 255)) for i in range(256)]
+    return bytes(half[0] for half in halves), bytes(half[1] for half in halves)
 
-    return {'image': img_str, 'width': canvas.width(), 'height': canvas.height()}
+
+EXR_COLOR_TABLES = half_float_tables(srgb_to_linear)
+EXR_ALPHA_TABLES = half_float_tables(lambda value: value)
+
+
+def iter_rgba(img):
+    """Yield the raw 8-bit RGBA pixels row by row from the bottom up, the layout of Blender image pixels."""
+    img = img.convertToFormat(QImage.Format_RGBA8888)
+    width, height = img.width(), img.height()
+    bits = img.constBits()
+    bits.setsize(img.sizeInBytes())
+    pixels, stride = memoryview(bits), img.bytesPerLine()
+    for y in range(height - 1, -1, -1):
+        yield bytes(pixels[y * stride:y * stride + width * 4])
+
+
+def iter_exr(img):
+    """Yield an uncompressed scanline OpenEXR file with linear half float RGBA channels."""
+    img = img.convertToFormat(QImage.Format_RGBA8888)
+    width, height = img.width(), img.height()
+    # EXR stores channels sorted by name; the number is the channel's byte offset in an RGBA8888 pixel
+    channels = [('A', 3, EXR_ALPHA_TABLES), ('B', 2, EXR_COLOR_TABLES),
+                ('G', 1, EXR_COLOR_TABLES), ('R', 0, EXR_COLOR_TABLES)]
+
+    header = bytearray(b'\x76\x2f\x31\x01' + struct.pack('<I', 2))
+
+    def add_attribute(name, kind, value):
+        header.extend(name.encode() + b'\0' + kind.encode() + b'\0' + struct.pack('<i', len(value)) + value)
+
+    window = struct.pack('<4i', 0, 0, width - 1, height - 1)
+    add_attribute('channels', 'chlist',
+                  b''.join(name.encode() + b'\0' + struct.pack('<iB3xii', 1, 0, 1, 1) for name, _, _ in channels) + b'\0')
+    add_attribute('compression', 'compression', b'\0')
+    add_attribute('dataWindow', 'box2i', window)
+    add_attribute('displayWindow', 'box2i', window)
+    add_attribute('lineOrder', 'lineOrder', b'\0')
+    add_attribute('pixelAspectRatio', 'float', struct.pack('<f', 1.0))
+    add_attribute('screenWindowCenter', 'v2f', struct.pack('<2f', 0.0, 0.0))
+    add_attribute('screenWindowWidth', 'float', struct.pack('<f', 1.0))
+    header.append(0)
+
+    # Uncompressed scanlines all have the same size, so the offset table is known up front
+    block_size = 8 + len(channels) * width * 2
+    first_block = len(header) + 8 * height
+    header.extend(struct.pack(f'<{height}Q', *(first_block + y * block_size for y in range(height))))
+    yield bytes(header)
+
+    bits = img.constBits()
+    bits.setsize(img.sizeInBytes())
+    pixels, stride = memoryview(bits), img.bytesPerLine()
+    for y in range(height):
+        row = bytes(pixels[y * stride:y * stride + width * 4])
+        block = bytearray(struct.pack('<ii', y, block_size - 8))
+        for _, offset, (low, high) in channels:
+            samples = row[offset::4]
+            plane = bytearray(2 * width)
+            plane[0::2] = samples.translate(low)
+            plane[1::2] = samples.translate(high)
+            block.extend(plane)
+        yield bytes(block)
 
 
 def get_project_info():
@@ -162,22 +884,219 @@ def get_layer_style(layer):
     return {}
 
 
-def export_layer_data(layer_id):
+class FeaturePage:
+    """Features selected by the bbox, filter, offset and limit query parameters of /layer/<id>.
+
+    bbox is "xmin,ymin,xmax,ymax" in project CRS and goes through the provider's spatial
+    index; filter is a QGIS expression. fields (comma separated names), no_attributes and
+    no_geometry restrict what the provider fetches. tolerance (layer units) or lod=auto
+    (one pixel at a target width of resolution pixels over the canvas extent) simplifies
+    geometries with topology-preserving simplification. Iterating yields the features of the
+    requested page; features without geometry are left out unless no_geometry is set, and offset,
+    limit and total only count the features that are yielded. The total is known once the last page
+    has been read, or up front with count. fids, when given, restricts the page to those feature ids.
+    """
+
+    def __init__(self, layer, params, fids=None):
+        self.layer = layer
+        self.request = QgsFeatureRequest()
+        self.filtered = False
+        self.with_geometry = not query_flag(params, 'no_geometry')
+        if not self.with_geometry:
+            self.request.setFlags(self.request.flags() | QgsFeatureRequest.NoGeometry)
+
+        # Field indices and value converters are resolved once here rather than per feature
+        layer_fields = layer.fields()
+        if query_flag(params, 'no_attributes'):
+            indices = []
+        elif params.get('fields'):
+            names = [name.strip() for name in params['fields'].split(',') if name.strip()]
+            unknown = [name for name in names if layer_fields.indexOf(name) < 0]
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+            indices = [layer_fields.indexOf(name) for name in names]
+        else:
+            indices = list(range(len(layer_fields)))
+        if len(indices) < len(layer_fields):
+            self.request.setSubsetOfAttributes(indices)
+        self.fields = [(layer_fields[index], index, attribute_converter(layer_fields[index])) for index in indices]
+
+        if params.get('bbox'):
+            self.request.setFilterRect(bbox_in_layer_crs(layer, params['bbox']))
+            self.filtered = True
+        if params.get('filter'):
+            expression = QgsExpression(params['filter'])
+            if expression.hasParserError():
+                raise ValueError(f"Invalid filter expression: {expression.parserErrorString()}")
+            if fids is not None:
+                # A request holds either a fid or an expression filter, so the ids join the expression
+                self.request.setFilterExpression(f"$id IN ({','.join(map(str, fids)) or 'NULL'}) "
+                                                 f"AND ({params['filter']})")
+            else:
+                self.request.setFilterExpression(params['filter'])
+            self.filtered = True
+        elif fids is not None:
+            self.request.setFilterFids(list(fids))
+            self.filtered = True
+        self.offset = int(params.get('offset', 0))
+        self.limit = int(params['limit']) if 'limit' in params else None
+        if self.offset < 0 or (self.limit is not None and self.limit < 0):
+            raise ValueError("offset and limit must not be negative")
+        if self.limit is not None and not self.with_geometry:
+            # One more than the page tells whether another page follows
+            self.request.setLimit(self.offset + self.limit + 1)
+        # Whether features follow the page, known once it has been read
+        self.more = None
+        if not self.filtered and not self.with_geometry:
+            self.total = layer.featureCount()
+        else:
+            self.total = self.count_matching() if query_flag(params, 'count') else None
+
+        self.tolerance = simplification_tolerance(layer, params)
+        self.vertices_in = self.vertices_out = 0
+
+    def count_matching(self):
+        # A scan of its own; only run when the total is needed before the page is read
+        request = QgsFeatureRequest(self.request)
+        request.setLimit(-1)
+        request.setNoAttributes()
+        if self.with_geometry:
+            return sum(1 for feature in self.layer.getFeatures(request) if feature.hasGeometry())
+        if not self.request.filterExpression():
+            request.setFlags(request.flags() | QgsFeatureRequest.NoGeometry)
+        return sum(1 for _ in self.layer.getFeatures(request))
+
+    def __iter__(self):
+        skipped = yielded = 0
+        self.more = False
+        for feature in self.layer.getFeatures(self.request):
+            if self.with_geometry and not feature.hasGeometry():
+                continue
+            if skipped < self.offset:
+                skipped += 1
+                continue
+            if yielded == self.limit:
+                self.more = True
+                break
+            if self.tolerance and self.with_geometry:
+                self.simplify(feature)
+            yielded += 1
+            yield feature
+        if not self.more:
+            self.total = skipped + yielded
+
+    def simplify(self, feature):
+        geom = feature.geometry()
+        self.vertices_in += geom.constGet().nCoordinates()
+        simplified = geom.simplify(self.tolerance)
+        if simplified and not simplified.isEmpty():
+            feature.setGeometry(simplified)
+            geom = simplified
+        self.vertices_out += geom.constGet().nCoordinates()
+
+    def attributes(self, feature):
+        values = feature.attributes()
+        return {field.name(): convert(values[index]) for field, index, convert in self.fields}
+
+    @property
+    def next_offset(self):
+        if self.limit is None:
+            return None
+        if self.more is None:
+            # Before the page is read, from the total
+            more = self.total is not None and self.offset + self.limit < self.total
+        else:
+            more = self.more
+        return self.offset + self.limit if more else None
+
+    def info(self):
+        info = {'total': self.total, 'offset': self.offset, 'next_offset': self.next_offset}
+        if self.tolerance:
+            info['simplification'] = self.simplification()
+        return info
+
+    def simplification(self):
+        return {'tolerance': self.tolerance, 'vertices_in': self.vertices_in, 'vertices_out': self.vertices_out}
+
+    def headers(self):
+        # Sent before the page is streamed, so a paged request needs the total up front
+        if self.limit is not None and self.total is None:
+            self.total = self.count_matching()
+        headers = {} if self.total is None else {'X-Total-Count': str(self.total)}
+        if self.next_offset is not None:
+            headers['X-Next-Offset'] = str(self.next_offset)
+        return headers
+
+
+def query_flag(params, name):
+    return params.get(name, '').lower() in ('1', 'true', 'yes')
+
+
+def attribute_converter(field):
+    python_type = {QVariant.Int: int, QVariant.LongLong: int, QVariant.Double: float,
+                   QVariant.Bool: bool, QVariant.String: str}.get(field.type())
+    if python_type is None:
+        return convert_to_python
+    return lambda value: value if isinstance(value, python_type) else convert_to_python(value)
+
+
+def parse_rectangle(text, name):
+    try:
+        xmin, ymin, xmax, ymax = (float(value) for value in text.split(','))
+    except ValueError:
+        raise ValueError(f"Invalid {name}: {text}")
+    return QgsRectangle(xmin, ymin, xmax, ymax)
+
+
+def simplification_tolerance(layer, params):
+    if params.get('lod') == 'auto':
+        if QgsWkbTypes.geometryType(layer.wkbType()) == QgsWkbTypes.PointGeometry:
+            return 0.0
+        canvas = iface.mapCanvas()
+        try:
+            resolution = int(params.get('resolution', canvas.width()))
+        except ValueError:
+            raise ValueError("resolution must be an integer")
+        if resolution <= 0:
+            raise ValueError("resolution must be positive")
+        extent = canvas.extent()
+        project = QgsProject.instance()
+        if layer.crs() != project.crs():
+            extent = QgsCoordinateTransform(project.crs(), layer.crs(), project).transformBoundingBox(extent)
+        return extent.width() / resolution
+    try:
+        tolerance = float(params.get('tolerance', 0))
+    except ValueError:
+        raise ValueError("tolerance must be a number")
+    if tolerance < 0:
+        raise ValueError("tolerance must not be negative")
+    return tolerance
+
+
+def bbox_in_layer_crs(layer, bbox):
+    rect = parse_rectangle(bbox, 'bbox')
+    project = QgsProject.instance()
+    if layer.crs() != project.crs():
+        rect = QgsCoordinateTransform(project.crs(), layer.crs(), project).transformBoundingBox(rect)
+    return rect
+
+
+def export_layer_data(layer_id, page=None):
     layer = QgsProject.instance().mapLayer(layer_id)
     if not layer:
         return {"error": "Layer not found"}
 
     if layer.type() == QgsMapLayer.VectorLayer:
+        page = page or FeaturePage(layer, {})
         features = []
-        for feature in layer.getFeatures():
-            geom = feature.geometry()
-            if geom:
-                features.append({
-                    "type": QgsWkbTypes.displayString(geom.wkbType()),
-                    "geometry": json.loads(geom.asJson()),
-                    "attributes": {field.name(): convert_to_python(feature[field.name()]) for field in layer.fields()}
-                })
-        return {"features": features}
+        for feature in page:
+            geom = feature.geometry() if page.with_geometry else None
+            features.append({
+                "type": QgsWkbTypes.displayString(geom.wkbType()) if geom else None,
+                "geometry": json.loads(geom.asJson()) if geom else None,
+                "attributes": page.attributes(feature)
+            })
+        return {"features": features, **page.info()}
     elif layer.type() == QgsMapLayer.RasterLayer:
         provider = layer.dataProvider()
         return {
@@ -197,6 +1116,239 @@ def export_layer_data(layer_id):
         return {"error": "Unsupported layer type"}
 
 
+def iter_features_ndjson(layer, page):
+    # One feature per line; QGIS' own GeoJSON for the geometry is embedded verbatim
+    for feature in page:
+        geom = feature.geometry() if page.with_geometry else None
+        geometry_type = json.dumps(QgsWkbTypes.displayString(geom.wkbType())) if geom else 'null'
+        yield ('{"type": %s, "geometry": %s, "attributes": %s}\n' % (
+            geometry_type, geom.asJson() if geom else 'null', json.dumps(page.attributes(feature)))).encode()
+
+
+class BinaryColumn:
+    """Typed attribute column of the binary layer payload, with a validity mask for NULLs."""
+    kinds = {
+        QVariant.Int: ('int', 'q', '<i8'),
+        QVariant.UInt: ('int', 'q', '<i8'),
+        QVariant.LongLong: ('int', 'q', '<i8'),
+        QVariant.ULongLong: ('int', 'q', '<i8'),
+        QVariant.Double: ('float', 'd', '<f8'),
+        QVariant.Bool: ('bool', 'B', '|u1'),
+    }
+
+    def __init__(self, field, index):
+        self.name = field.name()
+        self.index = index
+        self.kind, typecode, self.dtype = self.kinds.get(field.type(), ('string', 'q', '<i8'))
+        self.valid = array('B')
+        if self.kind == 'string':
+            self.offsets = array('q', [0])
+            self.values = bytearray()
+        else:
+            self.values = array(typecode)
+
+    def append(self, value):
+        is_null = value is None or isinstance(value, QVariant)
+        self.valid.append(0 if is_null else 1)
+        if self.kind == 'string':
+            if not is_null:
+                self.values += convert_to_python(value).encode()
+            self.offsets.append(len(self.values))
+        else:
+            self.values.append(0 if is_null else value)
+
+    def buffers(self):
+        prefix = f'attribute:{self.name}'
+        if self.kind == 'string':
+            yield prefix, '|u1', self.values
+            yield f'{prefix}:offsets', self.dtype, self.offsets
+        else:
+            yield prefix, self.dtype, self.values
+        yield f'{prefix}:valid', '|u1', self.valid
+
+
+def append_vertices(geometry, coordinates):
+    if isinstance(geometry, QgsPoint):
+        coordinates.extend((geometry.x(), geometry.y(), geometry.z() if geometry.is3D() else 0.0))
+        return
+    if not isinstance(geometry, QgsLineString):
+        geometry = geometry.curveToLine()
+    xs, ys = geometry.xVector(), geometry.yVector()
+    zs = geometry.zVector() if geometry.is3D() else [0.0] * len(xs)
+    for vertex in zip(xs, ys, zs):
+        coordinates.extend(vertex)
+
+
+def append_geometry(geometry, coordinates, ring_offsets, part_offsets):
+    if isinstance(geometry, QgsGeometryCollection):
+        parts = [geometry.geometryN(i) for i in range(geometry.numGeometries())]
+    else:
+        parts = [geometry]
+    for part in parts:
+        if isinstance(part, QgsCurvePolygon):
+            rings = [part.exteriorRing()] + [part.interiorRing(i) for i in range(part.numInteriorRings())]
+        else:
+            rings = [part]
+        for ring in rings:
+            if ring is not None:
+                append_vertices(ring, coordinates)
+                ring_offsets.append(len(coordinates) // 3)
+        part_offsets.append(len(ring_offsets) - 1)
+
+
+def export_layer_binary(layer, page, extra_header=None):
+    # Coordinates are a flat xyz float64 buffer; ring_offsets index vertices, part_offsets index rings
+    # and feature_offsets index parts, so every level can be sliced without per-vertex objects.
+    # extra_header, given the exported feature ids, returns more header entries
+    coordinates = array('d')
+    ring_offsets, part_offsets, feature_offsets = array('i', [0]), array('i', [0]), array('i', [0])
+    feature_ids = array('q')
+    columns = [BinaryColumn(field, index) for field, index, _ in page.fields]
+
+    for feature in page:
+        if page.with_geometry:
+            append_geometry(feature.geometry().constGet(), coordinates, ring_offsets, part_offsets)
+        feature_offsets.append(len(part_offsets) - 1)
+        feature_ids.append(feature.id())
+        values = feature.attributes()
+        for column in columns:
+            column.append(values[column.index])
+
+    header = {
+        'geometry_type': QgsWkbTypes.displayString(layer.wkbType()),
+        'feature_count': len(feature_ids),
+        'vertex_count': len(coordinates) // 3,
+        **page.info(),
+        'attributes': [{'name': column.name, 'type': column.kind} for column in columns],
+        **(extra_header(feature_ids) if extra_header else {}),
+    }
+    buffers = [
+        ('coordinates', '<f8', coordinates),
+        ('ring_offsets', '<i4', ring_offsets),
+        ('part_offsets', '<i4', part_offsets),
+        ('feature_offsets', '<i4', feature_offsets),
+        ('feature_ids', '<i8', feature_ids),
+    ]
+    for column in columns:
+        buffers.extend(column.buffers())
+    return encode_binary_payload(header, buffers)
+
+
+def encode_binary_payload(header, buffers):
+    header['buffers'] = {}
+    blobs, offset = [], 0
+    for name, dtype, data in buffers:
+        if isinstance(data, array) and sys.byteorder == 'big':
+            data = array(data.typecode, data)
+            data.byteswap()
+        data = bytes(data)
+        header['buffers'][name] = {'dtype': dtype, 'offset': offset, 'length': len(data)}
+        blobs.append(data + b'\0' * (-len(data) % 8))
+        offset += len(blobs[-1])
+    return b''.join([encode_binary_header(header)] + blobs)
+
+
+def encode_binary_header(header):
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b' ' * (-len(header_bytes) % 8)
+    return BINARY_MAGIC + struct.pack('<I', len(header_bytes)) + header_bytes
+
+
+class RasterWindow:
+    """One band of a raster layer resampled to a width x height grid over an extent, read in row tiles.
+
+    extent is "xmin,ymin,xmax,ymax" in project CRS (default: the layer extent); without width and
+    height the grid keeps the layer's native resolution. Layers in another CRS are reprojected, so
+    the grid and its header extent are always in project CRS. The payload is the binary header
+    followed by float32 rows from top to bottom, so the whole grid never has to be held in memory.
+    """
+
+    def __init__(self, layer, params):
+        # A private provider clone keeps resampling settings and reads away from QGIS' own rendering
+        self.provider = layer.dataProvider().clone()
+        project = QgsProject.instance()
+        self.source = self.provider
+        if layer.crs() != project.crs():
+            self.source = QgsRasterProjector()
+            self.source.setCrs(layer.crs(), project.crs(), project.transformContext())
+            self.source.setInput(self.provider)
+        try:
+            self.band = int(params.get('band', 1))
+            self.tile_rows = int(params.get('tile_rows', RASTER_TILE_ROWS))
+        except ValueError:
+            raise ValueError("band and tile_rows must be integers")
+        if not 1 <= self.band <= self.provider.bandCount():
+            raise ValueError(f"Band must be between 1 and {self.provider.bandCount()}")
+        if self.tile_rows < 1:
+            raise ValueError("tile_rows must be positive")
+
+        if params.get('extent'):
+            self.extent = parse_rectangle(params['extent'], 'extent')
+        elif layer.crs() != project.crs():
+            to_project = QgsCoordinateTransform(layer.crs(), project.crs(), project)
+            self.extent = to_project.transformBoundingBox(layer.extent())
+        else:
+            self.extent = layer.extent()
+        if self.extent.width() <= 0 or self.extent.height() <= 0:
+            raise ValueError("Empty extent")
+        # The native resolution is that of the layer cells the extent covers
+        layer_extent = bbox_in_layer_crs(layer, params['extent']) if params.get('extent') else layer.extent()
+        native_width = max(1, round(layer_extent.width() / layer.rasterUnitsPerPixelX()))
+        self.width, self.height = output_size(params, self.extent, min(native_width, RASTER_MAX_SIZE),
+                                              RASTER_MAX_SIZE)
+
+        resampling = params.get('resampling', 'nearest')
+        if resampling not in RASTER_RESAMPLING:
+            raise ValueError(f"resampling must be one of {', '.join(RASTER_RESAMPLING)}")
+        if resampling != 'nearest':
+            self.provider.enableProviderResampling(True)
+            self.provider.setZoomedInResamplingMethod(RASTER_RESAMPLING[resampling])
+            self.provider.setZoomedOutResamplingMethod(RASTER_RESAMPLING[resampling])
+
+        has_nodata = self.provider.sourceHasNoDataValue(self.band) and self.provider.useSourceNoDataValue(self.band)
+        self.nodata = self.provider.sourceNoDataValue(self.band) if has_nodata else None
+
+    def header(self):
+        return {
+            'width': self.width,
+            'height': self.height,
+            'band': self.band,
+            'dtype': '<f4',
+            'nodata': self.nodata,
+            'tile_rows': self.tile_rows,
+            'extent': {
+                'xmin': self.extent.xMinimum(),
+                'ymin': self.extent.yMinimum(),
+                'xmax': self.extent.xMaximum(),
+                'ymax': self.extent.yMaximum()
+            }
+        }
+
+    def iter_payload(self):
+        yield encode_binary_header(self.header())
+        cell_height = self.extent.height() / self.height
+        for row in range(0, self.height, self.tile_rows):
+            rows = min(self.tile_rows, self.height - row)
+            top = self.extent.yMaximum() - row * cell_height
+            tile_extent = QgsRectangle(self.extent.xMinimum(), top - rows * cell_height, self.extent.xMaximum(), top)
+            yield self.read_tile(tile_extent, rows)
+
+    def read_tile(self, tile_extent, rows):
+        block = self.source.block(self.band, tile_extent, self.width, rows)
+        if not block.convert(Qgis.Float32):
+            raise ValueError("Raster block could not be converted to float32")
+        if block.hasNoData() and not block.hasNoDataValue():
+            # Cells flagged only in the no-data bitmap (e.g. outside the raster) become NaN, written by QGIS
+            # in one pass over the block
+            block.setNoDataValue(float('nan'))
+            block.applyNoData()
+        values = array('f')
+        values.frombytes(bytes(block.data()))
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values.tobytes()
+
+
 def export_layer_style(layer_id):
     layer = QgsProject.instance().mapLayer(layer_id)
     return {"error": "Layer not found"} if not layer else get_layer_style(layer)
@@ -216,10 +1368,9 @@ def convert_to_python(value):
     return value if isinstance(value, (int, float, str, bool)) else str(value)
 
 
-def run_server():
-    server_address = ('', 8000)
-    httpd = HTTPServer(server_address, BlenderLinkRequestHandler)
-    print("BlenderLink server running on port 8000")
+def run_server(host=SERVER_HOST, port=SERVER_PORT, workers=SERVER_WORKERS):
+    httpd = BlenderLinkServer((host, port), BlenderLinkRequestHandler, workers)
+    print(f"BlenderLink server running on {host or '*'}:{port} with {workers} workers")
     httpd.serve_forever()
 
 
@@ -231,6 +1382,9 @@ def blenderlink_button():
     iface.addToolBarIcon(action)
 
 
+# Track layer revisions from the main thread, where the layer signals live
+watch_project()
+
 # Start the server in a separate thread
 server_thread = threading.Thread(target=run_server)
 server_thread.daemon = True
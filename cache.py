@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .client import qgis_get, read_body
+
+# Response headers kept with cached bodies
+CACHED_HEADERS = ('Content-Type', 'ETag', 'X-Layer-Revision', 'X-Server-Session', 'X-Image-Width',
+                  'X-Image-Height')
+
+
+class CachedResponse:
+    """A response read in full, fresh from QGIS or from the payload cache.
+
+    source is None for fresh responses, 'revalidated' when QGIS confirmed the cached copy with a 304
+    and 'offline' when QGIS could not be reached.
+    """
+
+    def __init__(self, status_code, headers, content, source=None):
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.source = source
+
+    def json(self):
+        return json.loads(self.content)
+
+    def iter_content(self, chunk_size=1 << 20):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+
+class PayloadCache:
+    """Content-addressed on-disk cache of QGIS responses with least recently used eviction.
+
+    Bodies are stored once under blobs/<sha256>; index.json maps each request (server URL, path and
+    parameters) to its body, ETag and headers. Requests are revalidated with If-None-Match, so the
+    server's revision decides whether the copy is current, and the copy stands in when QGIS is down.
+    Cache hits only touch the index in memory; it is written with the next store or eviction.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.offline = True
+        self.directory = None
+        self.max_bytes = 0
+        self.entries = {}
+        self.touched = False
+        self.lock = threading.Lock()
+
+    def configure(self, enabled, directory, max_bytes, offline):
+        with self.lock:
+            self.enabled = enabled and bool(directory)
+            self.offline = offline
+            self.max_bytes = max_bytes
+            if directory != self.directory:
+                self.directory = directory
+                self.entries = self.load_index()
+            if self.enabled:
+                self.evict()
+                self.save_index()
+
+    def load_index(self):
+        try:
+            with open(os.path.join(self.directory, 'index.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, 'index.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(path + '.tmp', path)
+        self.touched = False
+
+    def flush(self):
+        # Write the last used times of cache hits since the index was last saved
+        with self.lock:
+            if self.touched and self.directory:
+                self.save_index()
+
+    def blob_path(self, digest):
+        return os.path.join(self.directory, 'blobs', digest)
+
+    def request_key(self, server_url, path, params):
+        key = json.dumps([server_url.rstrip('/'), path, sorted((params or {}).items())])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and not os.path.exists(self.blob_path(entry['digest'])):
+                del self.entries[key]
+                entry = None
+            return entry
+
+    def read(self, key, entry, source):
+        with open(self.blob_path(entry['digest']), 'rb') as f:
+            content = f.read()
+        with self.lock:
+            if key in self.entries:
+                self.entries[key]['used'] = time.time()
+                self.touched = True
+        return CachedResponse(200, entry['headers'], content, source)
+
+    def store(self, key, response, content):
+        digest = hashlib.sha256(content).hexdigest()
+        blob = self.blob_path(digest)
+        if not os.path.exists(blob):
+            # Identical bodies may be stored by several threads at once; each writes its own temporary
+            # file, and whichever replace lands last leaves the same bytes
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            fd, temporary = tempfile.mkstemp(dir=os.path.dirname(blob), prefix=digest, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(content)
+                os.replace(temporary, blob)
+            except BaseException:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+                raise
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        with self.lock:
+            self.entries[key] = {'digest': digest, 'size': len(content), 'etag': headers.get('ETag', ''),
+                                 'headers': headers, 'used': time.time()}
+            self.evict()
+            self.save_index()
+
+    def evict(self):
+        # Drop the least recently used requests until the bodies still referenced fit in max_bytes
+        sizes = {entry['digest']: entry['size'] for entry in self.entries.values()}
+        total = sum(sizes.values())
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1]['used']):
+            if total <= self.max_bytes:
+                break
+            del self.entries[key]
+            if all(other['digest'] != entry['digest'] for other in self.entries.values()):
+                total -= entry['size']
+                try:
+                    os.remove(self.blob_path(entry['digest']))
+                except OSError:
+                    pass
+
+    def clear(self):
+        with self.lock:
+            for digest in {entry['digest'] for entry in self.entries.values()}:
+                try:
+                    os.remove(self.blob_path(digest))
+                except OSError:
+                    pass
+            self.entries = {}
+            if self.directory:
+                self.save_index()
+
+    def size(self):
+        with self.lock:
+            return sum({entry['digest']: entry['size'] for entry in self.entries.values()}.values())
+
+
+payload_cache = PayloadCache()
+
+
+def cached_get(server_url, path, params=None, headers=None, timeout=None, cancel=None, progress=None,
+               store=True):
+    """GET a BlenderLink endpoint through the payload cache and return a CachedResponse.
+
+    A caller's own If-None-Match is honoured: a 304 for that tag is passed through. Otherwise a 304
+    for the cached tag, or a failure to reach QGIS, is answered from the cache when it has a copy.
+    Callers that keep large bodies themselves, such as snapshot pixels and tiles, pass store=False and
+    revalidate with their own tag. The content is the bytearray the body was read into.
+    """
+    cache = payload_cache
+    key = cache.request_key(server_url, path, params) if cache.enabled and store else None
+    entry = cache.lookup(key) if key else None
+    headers = dict(headers or {})
+    own_tags = headers.get('If-None-Match', '')
+    if entry and entry['etag'] and entry['etag'] not in own_tags:
+        headers['If-None-Match'] = ', '.join(filter(None, [own_tags, entry['etag']]))
+
+    try:
+        response = qgis_get(server_url, path, params=params, headers=headers, timeout=timeout, stream=True)
+    except (requests.ConnectionError, requests.Timeout):
+        if entry and cache.offline:
+            return cache.read(key, entry, 'offline')
+        raise
+
+    if response.status_code == 304:
+        etag = response.headers.get('ETag', '')
+        if entry and etag == entry['etag'] and etag not in own_tags:
+            return cache.read(key, entry, 'revalidated')
+        return CachedResponse(304, response.headers, b'')
+
+    content = read_body(response, cancel, progress)
+    # Errors come back as JSON without an ETag; untagged bodies are kept for offline use only
+    if key and response.status_code == 200 and (
+            'ETag' in response.headers or not response.headers.get('Content-Type', '').startswith('application/json')):
+        cache.store(key, response, content)
+    return CachedResponse(response.status_code, response.headers, content)
@@ -0,0 +1,82 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING as URLLIB3_ENCODINGS
+from urllib3.util.retry import Retry
+
+# Only advertise codings urllib3 can decode; zstd needs urllib3 2 with zstandard installed
+ACCEPT_ENCODING = 'zstd, gzip' if 'zstd' in URLLIB3_ENCODINGS else 'gzip'
+
+# Keep-alive connections kept per server, retries with exponential backoff for failed connections
+# and gateway errors, and threads issuing independent requests concurrently
+POOL_SIZE = 8
+RETRIES = Retry(total=3, connect=3, read=1, backoff_factor=0.25, status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({'GET'}))
+REQUEST_WORKERS = 4
+
+sessions = {}
+sessions_lock = threading.Lock()
+executor = ThreadPoolExecutor(max_workers=REQUEST_WORKERS, thread_name_prefix='qgis-request')
+# Path, status, milliseconds until the response headers arrived and body size of the latest requests
+request_timings = deque(maxlen=20)
+
+
+class QGISServerError(Exception):
+    """Error reported by the BlenderLink server itself, or a request that was cancelled."""
+
+
+def session_for(server_url):
+    """The pooled keep-alive session shared by every request to server_url."""
+    with sessions_lock:
+        session = sessions.get(server_url)
+        if session is None:
+            session = sessions[server_url] = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=RETRIES)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        return session
+
+
+def close_sessions():
+    with sessions_lock:
+        for session in sessions.values():
+            session.close()
+        sessions.clear()
+
+
+def qgis_get(server_url, path, params=None, headers=None, **kwargs):
+    """GET a BlenderLink endpoint, advertising the response compressions the add-on can decode."""
+    headers = {'Accept-Encoding': ACCEPT_ENCODING, **(headers or {})}
+    started = time.perf_counter()
+    response = session_for(server_url).get(f'{server_url}{path}', params=params, headers=headers, **kwargs)
+    request_timings.append((path, response.status_code, (time.perf_counter() - started) * 1000,
+                            response.headers.get('Content-Length')))
+    return response
+
+
+def qgis_submit(server_url, path, params=None, headers=None, **kwargs):
+    """Start qgis_get on the request pool and return its Future, to overlap independent requests."""
+    return executor.submit(qgis_get, server_url, path, params, headers, **kwargs)
+
+
+def read_body(response, cancel=None, progress=None, chunk_size=1 << 20):
+    """Read a streamed response, reporting the bytes received so far and stopping once cancel is set."""
+    body = bytearray()
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if cancel is not None and cancel.is_set():
+            response.close()
+            raise QGISServerError("Request cancelled")
+        body += chunk
+        if progress:
+            progress(len(body))
+    return body
+
+
+def check_json_error(response, default):
+    """Raise the error of a JSON response from an endpoint that otherwise returns binary data."""
+    if response.headers.get('Content-Type', '').startswith('application/json'):
+        raise QGISServerError(response.json().get('error', default))
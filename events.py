@@ -0,0 +1,133 @@
+import json
+import queue
+import threading
+
+import bpy
+from bpy.app.handlers import persistent
+
+from .client import qgis_get
+from .operator_connect import update_layers, update_project_info, update_qgis_view
+from .operator_sync_layer import QGIS_OT_sync_layer
+
+# Seconds between reconnection attempts, between checks for received events, and without any data
+# (the server sends a keep-alive comment every 15 seconds) before the stream is considered dead
+RETRY_SECONDS = 2.0
+POLL_INTERVAL = 0.25
+READ_TIMEOUT = 60
+
+
+class EventSubscriber:
+    """Reads the /events stream of the QGIS server on a background thread.
+
+    Events are queued as (event, data) pairs for apply_events() on the main thread; the thread
+    reconnects after errors until stop() is called.
+    """
+
+    def __init__(self, server_url, timeout):
+        self.server_url = server_url
+        self.timeout = timeout
+        self.events = queue.Queue()
+        self.stopped = threading.Event()
+        self.response = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.response is not None:
+            self.response.close()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.response = qgis_get(self.server_url, '/events', stream=True,
+                                         timeout=(self.timeout, READ_TIMEOUT))
+                self.response.encoding = 'utf-8'
+                self.read_events(self.response)
+            except Exception as e:
+                if not self.stopped.is_set():
+                    print("QGIS event stream interrupted:", e)
+            self.stopped.wait(RETRY_SECONDS)
+
+    def read_events(self, response):
+        event, data = 'message', []
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if self.stopped.is_set():
+                return
+            if not line:
+                if data:
+                    self.events.put((event, json.loads('\n'.join(data))))
+                event, data = 'message', []
+            elif line.startswith('event:'):
+                event = line[6:].strip()
+            elif line.startswith('data:'):
+                data.append(line[5:].strip())
+
+
+subscriber = None
+# Latest revision announced per layer whose update has not started yet
+pending_revisions = {}
+
+
+def start(server_url, timeout):
+    global subscriber
+    stop()
+    subscriber = EventSubscriber(server_url, timeout)
+    subscriber.start()
+    if not bpy.app.timers.is_registered(apply_events):
+        # Persistent, so that the timer survives loading another file
+        bpy.app.timers.register(apply_events, first_interval=POLL_INTERVAL, persistent=True)
+
+
+def stop():
+    global subscriber
+    if subscriber is not None:
+        subscriber.stop()
+        subscriber = None
+    pending_revisions.clear()
+
+
+def update_live(scene, context):
+    # Update callback of Scene.qgis_live
+    if scene.qgis_live:
+        start(scene.qgis_server_url, scene.qgis_timeout)
+    else:
+        stop()
+
+
+@persistent
+def restore_live(*args):
+    # load_post handler: the stream belongs to the scene that was open, so follow qgis_live of the loaded one
+    update_live(bpy.context.scene, bpy.context)
+
+
+def apply_events():
+    # bpy.app.timers callback: apply what the stream delivered, touching only what changed
+    if subscriber is None:
+        return None
+    context = bpy.context
+    while True:
+        try:
+            event, data = subscriber.events.get_nowait()
+        except queue.Empty:
+            break
+        if event == 'project':
+            update_project_info(context, data)
+            update_qgis_view(context, data)
+        elif event == 'layers':
+            update_layers(context, data)
+        elif event == 'revision':
+            pending_revisions[data['layer_id']] = data['revision']
+
+    for layer_id, revision in list(pending_revisions.items()):
+        if layer_id in QGIS_OT_sync_layer.running:
+            continue
+        del pending_revisions[layer_id]
+        layer = next((layer for layer in context.scene.qgis_layers if layer.layer_id == layer_id), None)
+        if (layer and layer.server_session and layer.revision != revision
+                and bpy.data.collections.get(layer.name)):
+            with context.temp_override(window=context.window_manager.windows[0]):
+                bpy.ops.qgis.sync_layer('INVOKE_DEFAULT', layer_id=layer_id)
+    return POLL_INTERVAL
@@ -0,0 +1,174 @@
+import json
+import struct
+
+import numpy as np
+
+BINARY_MAGIC = b'BLNK'
+BINARY_CONTENT_TYPE = 'application/vnd.blenderlink.columnar'
+# Blender attribute type and array dtype for each payload attribute kind; strings are dictionary encoded
+ATTRIBUTE_TYPES = {'int': ('INT', np.int32), 'float': ('FLOAT', np.float32), 'bool': ('BOOLEAN', bool),
+                   'string': ('INT', np.int32)}
+
+
+class LayerData:
+    """Columnar vector layer as sent by the /layer/<id>?format=binary endpoint.
+
+    Coordinates are an (N, 3) float64 array. ``ring_offsets`` index into the
+    coordinates, ``part_offsets`` into the rings and ``feature_offsets`` into the
+    parts, so geometry can be sliced at any level without per-vertex objects.
+    """
+
+    def __init__(self, header, buffers):
+        self.header = header
+        self.geometry_type = header.get('geometry_type', '')
+        self.coordinates = buffers['coordinates'].reshape(-1, 3)
+        self.ring_offsets = buffers['ring_offsets']
+        self.part_offsets = buffers['part_offsets']
+        self.feature_offsets = buffers['feature_offsets']
+        self.feature_ids = buffers['feature_ids']
+        self.attributes = {}
+        for spec in header.get('attributes', []):
+            prefix = f"attribute:{spec['name']}"
+            values = buffers[prefix]
+            if spec['type'] == 'string':
+                offsets = buffers[f'{prefix}:offsets']
+                raw = values.tobytes()
+                values = [raw[offsets[i]:offsets[i + 1]].decode() for i in range(len(offsets) - 1)]
+            elif spec['type'] == 'bool':
+                values = values.astype(bool)
+            self.attributes[spec['name']] = (spec['type'], values, buffers[f'{prefix}:valid'].astype(bool))
+
+    @property
+    def feature_count(self):
+        return len(self.feature_ids)
+
+    def feature_parts(self, index):
+        """Return the parts of a feature, each a list of (start, end) vertex ranges, one per ring."""
+        parts = []
+        for part in range(self.feature_offsets[index], self.feature_offsets[index + 1]):
+            rings = range(self.part_offsets[part], self.part_offsets[part + 1])
+            parts.append([(int(self.ring_offsets[ring]), int(self.ring_offsets[ring + 1])) for ring in rings])
+        return parts
+
+    def feature_vertex_range(self, index):
+        first_ring = self.part_offsets[self.feature_offsets[index]]
+        last_ring = self.part_offsets[self.feature_offsets[index + 1]]
+        return int(self.ring_offsets[first_ring]), int(self.ring_offsets[last_ring])
+
+    def open_ring(self, start, end):
+        """Drop the closing vertex of a polygon ring that repeats its first vertex."""
+        if end - start > 1 and np.array_equal(self.coordinates[start], self.coordinates[end - 1]):
+            return start, end - 1
+        return start, end
+
+    def vertex_feature_index(self):
+        """Index of the owning feature for every vertex."""
+        feature_starts = self.ring_offsets[self.part_offsets[self.feature_offsets]]
+        return np.repeat(np.arange(self.feature_count), np.diff(feature_starts))
+
+    def open_rings(self):
+        """Vertex mask without the repeated closing vertex of every ring, and the ring offsets into it."""
+        starts, ends = self.ring_offsets[:-1], self.ring_offsets[1:]
+        closed = np.zeros(len(starts), dtype=bool)
+        long = ends - starts > 1
+        closed[long] = np.all(self.coordinates[starts[long]] == self.coordinates[ends[long] - 1], axis=1)
+        keep = np.ones(len(self.coordinates), dtype=bool)
+        keep[ends[closed] - 1] = False
+        lengths = ends - starts - closed
+        return keep, np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+
+    def line_edges(self):
+        """(M, 2) vertex index pairs joining consecutive vertices within each ring."""
+        starts = np.arange(len(self.coordinates) - 1)
+        connected = np.ones(len(starts), dtype=bool)
+        ring_starts = self.ring_offsets[1:-1]
+        connected[ring_starts[ring_starts > 0] - 1] = False
+        return np.column_stack((starts, starts + 1))[connected]
+
+    def attribute_columns(self):
+        """Per-feature attribute columns ready for mesh attributes, {name: (attribute type, values, lookup)}.
+
+        Strings become indices into their ``lookup`` list, -1 for NULL; other NULLs become 0.
+        """
+        columns = {}
+        for name, (kind, values, valid) in self.attributes.items():
+            attribute_type, dtype = ATTRIBUTE_TYPES[kind]
+            lookup = None
+            if kind == 'string':
+                codes = np.full(len(values), -1, dtype=dtype)
+                lookup = []
+                if valid.any():
+                    lookup, codes[valid] = np.unique(np.array(values, dtype=str)[valid], return_inverse=True)
+                    lookup = lookup.tolist()
+                values = codes
+            else:
+                values = np.where(valid, values, 0).astype(dtype)
+            columns[name] = (attribute_type, values, lookup)
+        return columns
+
+    def feature_attributes(self, index):
+        attributes = {}
+        for name, (kind, values, valid) in self.attributes.items():
+            if valid[index]:
+                value = values[index]
+                attributes[name] = value if kind == 'string' else value.item()
+        return attributes
+
+
+def read_raster(response):
+    """Read a /raster/<id> payload from a streamed response into a (height, width) float32 array.
+
+    Chunks are copied straight into the preallocated grid; no-data cells become NaN.
+    """
+    chunks = response.iter_content(chunk_size=1 << 20)
+    buffer = bytearray()
+
+    def fill(size):
+        while len(buffer) < size:
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError("Truncated raster payload from QGIS server")
+            buffer.extend(chunk)
+
+    fill(8)
+    if buffer[:4] != BINARY_MAGIC:
+        raise ValueError("Unexpected raster payload from QGIS server")
+    header_length, = struct.unpack_from('<I', buffer, 4)
+    fill(8 + header_length)
+    header = json.loads(bytes(buffer[8:8 + header_length]))
+
+    grid = np.empty((header['height'], header['width']), dtype=header['dtype'])
+    view = memoryview(grid).cast('B')
+    data = buffer[8 + header_length:]
+    filled = 0
+    while True:
+        data = data[:len(view) - filled]
+        view[filled:filled + len(data)] = data
+        filled += len(data)
+        if filled == len(view):
+            break
+        data = next(chunks, None)
+        if data is None:
+            raise ValueError("Truncated raster payload from QGIS server")
+
+    if header.get('nodata') is not None:
+        grid[grid == np.float32(header['nodata'])] = np.nan
+    return header, grid
+
+
+def decode_layer_data(payload):
+    if payload[:4] != BINARY_MAGIC:
+        raise ValueError("Unexpected layer payload from QGIS server")
+    header_length, = struct.unpack_from('<I', payload, 4)
+    header = json.loads(payload[8:8 + header_length])
+    data = memoryview(payload)[8 + header_length:]
+
+    buffers = {}
+    for name, spec in header['buffers'].items():
+        dtype = np.dtype(spec['dtype'])
+        if spec['length'] == 0:
+            buffers[name] = np.empty(0, dtype=dtype)
+        else:
+            buffers[name] = np.frombuffer(data, dtype=dtype, count=spec['length'] // dtype.itemsize,
+                                          offset=spec['offset'])
+    return LayerData(header, buffers)
@@ -0,0 +1,121 @@
+import threading
+import time
+
+from .utils import error_message
+
+
+class BackgroundOperator:
+    """Mixin for operators that talk to QGIS without blocking Blender.
+
+    ``prepare`` runs on the main thread and copies everything the request needs out of bpy.
+    ``fetch`` runs on a worker thread and must not touch bpy; it downloads and decodes.
+    ``build`` edits Blender data back on the main thread; as a generator it yields its progress
+    (0..1) between small steps, and each timer tick runs steps for at most ``step_seconds`` so
+    the viewport stays responsive; yielding None waits for the next tick instead. Esc cancels at
+    any point and ``cleanup`` undoes a partial build. ``execute`` runs the same stages
+    synchronously for scripts.
+    """
+    step_seconds = 1 / 30
+    timer_interval = 0.05
+
+    def prepare(self, context):
+        return True
+
+    def fetch(self):
+        pass
+
+    def build(self, context):
+        pass
+
+    def cleanup(self, context):
+        pass
+
+    def set_status(self, text):
+        # Safe from the worker; shown in the status bar on the next timer tick
+        self._status = text
+
+    def execute(self, context):
+        self._cancel = threading.Event()
+        self._status = ""
+        try:
+            if not self.prepare(context):
+                return {'CANCELLED'}
+            self.fetch()
+            for progress in self.build(context) or ():
+                if progress is None:
+                    time.sleep(self.timer_interval)
+        except Exception as e:
+            self.cleanup(context)
+            self.report({'ERROR'}, error_message(e))
+            return {'CANCELLED'}
+        return {'FINISHED'}
+
+    def invoke(self, context, event):
+        self._cancel = threading.Event()
+        self._status = "Connecting"
+        self._error = None
+        self._steps = None
+        try:
+            if not self.prepare(context):
+                return {'CANCELLED'}
+        except Exception as e:
+            self.report({'ERROR'}, error_message(e))
+            return {'CANCELLED'}
+
+        self._worker = threading.Thread(target=self._run_fetch, daemon=True)
+        self._worker.start()
+        self._timer = context.window_manager.event_timer_add(self.timer_interval, window=context.window)
+        context.window_manager.modal_handler_add(self)
+        self._show_status(context)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            self._cancel.set()
+            self._stop(context)
+            self.report({'WARNING'}, f"{self.bl_label} cancelled")
+            return {'CANCELLED'}
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        if self._worker.is_alive():
+            self._show_status(context)
+            return {'PASS_THROUGH'}
+
+        try:
+            if self._error is not None:
+                raise self._error
+            if self._steps is None:
+                self._steps = iter(self.build(context) or ())
+            deadline = time.perf_counter() + self.step_seconds
+            for progress in self._steps:
+                if progress is None:
+                    self._show_status(context)
+                    return {'PASS_THROUGH'}
+                if time.perf_counter() > deadline:
+                    self.set_status(f"Building {progress:.0%}")
+                    self._show_status(context)
+                    return {'PASS_THROUGH'}
+        except Exception as e:
+            self._stop(context)
+            self.report({'ERROR'}, error_message(e))
+            return {'CANCELLED'}
+
+        self._finish(context)
+        return {'FINISHED'}
+
+    def _run_fetch(self):
+        try:
+            self.fetch()
+        except Exception as e:
+            self._error = e
+
+    def _show_status(self, context):
+        context.workspace.status_text_set(f"{self.bl_label}: {self._status} (Esc to cancel)")
+
+    def _stop(self, context):
+        self.cleanup(context)
+        self._finish(context)
+
+    def _finish(self, context):
+        context.window_manager.event_timer_remove(self._timer)
+        context.workspace.status_text_set(None)
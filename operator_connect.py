@@ -1,36 +1,38 @@
 import bpy
-import requests
-import bmesh
-import base64
-from bpy.props import StringProperty
 from bpy.types import Operator
-from .utils import error_handler, add_custom_properties
+from .client import qgis_get, qgis_submit
+from .modal import BackgroundOperator
 
 # Operator to connect to QGIS and retrieve available layers
-class QGIS_OT_connect(Operator):
+class QGIS_OT_connect(BackgroundOperator, Operator):
     bl_idname = "qgis.connect"
     bl_label = "Link"
     bl_description = "Connect to QGIS and retrieve available layers"
 
-    @error_handler
-    def execute(self, context):
+    def prepare(self, context):
+        self.request = (context.scene.qgis_server_url, context.scene.qgis_timeout)
+        return True
+
+    def fetch(self):
         # Fetch project and layer information from QGIS server
-        response_layer_info = requests.get(f'{context.scene.qgis_server_url}/layers')
-        data_layer_info = response_layer_info.json()
-        
-        response_project_info = requests.get(f'{context.scene.qgis_server_url}/project_info')
-        data_project_info = response_project_info.json()
+        server_url, timeout = self.request
+        self.set_status("Reading project and layers")
+        layers = qgis_submit(server_url, '/layers', timeout=timeout)
+        self.project_info = qgis_get(server_url, '/project_info', timeout=timeout).json()
+        self.layer_info = layers.result().json()
+
+    def build(self, context):
+        data_layer_info, data_project_info = self.layer_info, self.project_info
 
         # Update project info and layers in Blender
-        self.update_project_info(context, data_project_info)
-        self.update_layers(context, data_layer_info)
+        update_project_info(context, data_project_info)
+        update_layers(context, data_layer_info)
 
         # Create or replace QGIS camera and rectangle
         self.create_or_replace_qgis_camera(context, data_project_info)
 
         context.scene.qgis_linked = True
         self.report({'INFO'}, f"Retrieved {len(context.scene.qgis_layers)} layers")
-        return {'FINISHED'}
 
     def create_or_replace_qgis_camera(self, context, project_info):
         # Remove existing qgis_camera and qgis_extent objects if they exist
@@ -73,42 +75,73 @@ class QGIS_OT_connect(Operator):
 
         context.scene.camera = cam_object
 
-    def update_project_info(self, context, data):
-        # Update project information in Blender
-        context.scene.qgis_project.clear()
-        item = context.scene.qgis_project.add()
-        item.label = "Project Information"
-        item.name = data.get('project_name', 'Unnamed project')
-        item.crs = data.get('project_crs', '').get('auth_id', 'Unspecified CRS')
-        item.xmin = data.get('project_extent', '').get('xmin', 0)
-        item.xmax = data.get('project_extent', '').get('xmax', 0)
-        item.ymin = data.get('project_extent', '').get('ymin', 0)
-        item.ymax = data.get('project_extent', '').get('ymax', 0)
-        item.canvas_width = data.get('canvas_size', '').get('width', 0)
-        item.canvas_height = data.get('canvas_size', '').get('height', 0)
-        item.canvas_scale = data.get('canvas_scale', 1.0)
-
-    def update_layers(self, context, data):
-        # Update layers in Blender
-        context.scene.qgis_layers.clear()
-        layers = data.get('layers', [])
-        for layer in layers:
-            item = context.scene.qgis_layers.add()
-            item.name = layer.get('name', 'Unnamed Layer')
-            item.layer_id = layer.get('id', '')
-
-            # Handle different layer types
-            if layer.get('type') == 'vector':
-                item.type = layer.get('geometry_type', 'Unknown Vector')
-            elif layer.get('type') == 'Displacement':
-                item.type = 'Displacement'
-            else:
-                item.type = layer.get('type', 'Unknown')
-
-            item.feature_count = str(layer.get('feature_count', 0))
-
-        # Print the layers data for debugging
-        print("Layers data received from QGIS:", data)
+
+def update_project_info(context, data):
+    # Update project information in Blender
+    context.scene.qgis_project.clear()
+    item = context.scene.qgis_project.add()
+    item.label = "Project Information"
+    item.name = data.get('project_name', 'Unnamed project')
+    item.crs = data.get('project_crs', '').get('auth_id', 'Unspecified CRS')
+    item.xmin = data.get('project_extent', '').get('xmin', 0)
+    item.xmax = data.get('project_extent', '').get('xmax', 0)
+    item.ymin = data.get('project_extent', '').get('ymin', 0)
+    item.ymax = data.get('project_extent', '').get('ymax', 0)
+    item.canvas_width = data.get('canvas_size', '').get('width', 0)
+    item.canvas_height = data.get('canvas_size', '').get('height', 0)
+    item.canvas_scale = data.get('canvas_scale', 1.0)
+
+
+def update_layers(context, data):
+    # Update layers in Blender in place, so that each layer keeps its import options, selection and
+    # what is needed to skip re-importing it unchanged; the list follows the QGIS layer order
+    layers = data.get('layers', [])
+    layer_ids = [layer.get('id', '') for layer in layers]
+    items = context.scene.qgis_layers
+    for index in reversed(range(len(items))):
+        if items[index].layer_id not in layer_ids:
+            items.remove(index)
+    for position, layer in enumerate(layers):
+        index = next((index for index, item in enumerate(items) if item.layer_id == layer_ids[position]), None)
+        if index is None:
+            items.add().layer_id = layer_ids[position]
+            index = len(items) - 1
+        if index != position:
+            items.move(index, position)
+        item = items[position]
+        item.name = layer.get('name', 'Unnamed Layer')
+
+        # Handle different layer types
+        if layer.get('type') == 'vector':
+            item.type = layer.get('geometry_type', 'Unknown Vector')
+        elif layer.get('type') == 'Displacement':
+            item.type = 'Displacement'
+        else:
+            item.type = layer.get('type', 'Unknown')
+
+        item.feature_count = str(layer.get('feature_count', 0))
+
+
+def update_qgis_view(context, project_info):
+    # Follow the QGIS canvas by moving the existing camera and extent rectangle; qgis_offset is kept
+    # so that imported layers stay in place
+    extent = project_info['project_extent']
+    width = extent['xmax'] - extent['xmin']
+    height = extent['ymax'] - extent['ymin']
+    offset = context.scene.qgis_offset
+    x = (extent['xmax'] + extent['xmin']) / 2 - offset[0]
+    y = (extent['ymax'] + extent['ymin']) / 2 - offset[1]
+
+    rect = bpy.data.objects.get("qgis_extent")
+    if rect:
+        rect.location = (x, y, 0)
+        rect.scale = (width, height, 1)
+    cam_object = bpy.data.objects.get("qgis_camera")
+    if cam_object:
+        cam_object.location = (x, y, max(width, height))
+        cam_object.data.ortho_scale = max(width, height)
+    context.scene.render.resolution_x = project_info['canvas_size']['width']
+    context.scene.render.resolution_y = project_info['canvas_size']['height']
 
 
 def register():
@@ -1,111 +1,105 @@
-import base64
 import bpy
-import requests
-import math
-import bmesh
+import numpy as np
 from bpy.types import Operator
 from bpy.props import StringProperty, FloatProperty
+from .cache import cached_get
+from .client import check_json_error
+from .layer_data import read_raster
+from .modal import BackgroundOperator
+from .terrain import grid_shape, heightfield
+from .utils import fill_mesh, visible_extent_bbox
 
 
-class QGIS_OT_displacement_map(Operator):
+class QGIS_OT_displacement_map(BackgroundOperator, Operator):
     bl_idname = "qgis.displacement_map"
-    bl_label = "Set displacement"
-    bl_description = "Set the QGIS map canvas snapshot as displacement map"
+    bl_label = "Build terrain"
+    bl_description = "Build a terrain mesh over the QGIS extent rectangle from the elevation layer"
 
     layer_id: StringProperty()
     displacement_strength: FloatProperty(
         name="Displacement Strength",
-        description="Strength of the displacement effect",
+        description="Vertical scale of the terrain",
         default=1.0,
         min=0.0,
         max=10.0
     )
 
-    def execute(self, context):
-        try:
-            self.import_as_displacement(context)
-            self.report({'INFO'}, "Elevation map from QGIS updated")
-            return {'FINISHED'}
-        except Exception as e:
-            self.report({'ERROR'}, f"Error setting displacement map: {str(e)}")
-            return {'CANCELLED'}
+    def prepare(self, context):
+        if not bpy.data.objects.get("qgis_extent"):
+            self.report({'ERROR'}, "qgis_extent object not found")
+            return False
+
+        # Sample the DEM band over the extent rectangle, one sample per terrain vertex
+        bbox = visible_extent_bbox(context)
+        xmin, ymin, xmax, ymax = map(float, bbox.split(','))
+        scene = context.scene
+        columns, rows = grid_shape(xmax - xmin, ymax - ymin, scene.qgis_terrain_vertices,
+                                   scene.qgis_terrain_resolution)
+        # /raster samples cell centres; growing the extent by half a cell puts them on the vertices,
+        # the outer ones on the edges of the rectangle
+        half_x, half_y = (xmax - xmin) / (columns - 1) / 2, (ymax - ymin) / (rows - 1) / 2
+        extent = f'{xmin - half_x},{ymin - half_y},{xmax + half_x},{ymax + half_y}'
+        params = {'extent': extent, 'resampling': 'bilinear', 'width': columns, 'height': rows}
+        self.request = (scene.qgis_server_url, f'/raster/{self.layer_id}', params, scene.qgis_timeout)
+        offset = scene.qgis_offset
+        self.bounds = (xmin - offset[0], ymin - offset[1], xmax - offset[0], ymax - offset[1])
+        self.scale = self.displacement_strength
+        self.tolerance = scene.qgis_terrain_tolerance
+        return True
+
+    def fetch(self):
+        server_url, path, params, timeout = self.request
+        self.set_status("Sampling elevation in QGIS")
+        response = cached_get(server_url, path, params=params, timeout=timeout, cancel=self._cancel,
+                              progress=lambda size: self.set_status(f"Downloading elevation: {size / 1e6:.1f} MB"))
+        check_json_error(response, "Failed to read raster")
+        if response.status_code != 200:
+            raise ValueError(f"Failed to fetch elevation: HTTP {response.status_code}")
+        _, heights = read_raster(response)
+        self.samples = heights.shape
+
+        # Heights are baked into the vertices here, off the main thread; decimation included
+        self.set_status("Building terrain mesh")
+        self.terrain = heightfield(heights, self.bounds, self.scale, self.tolerance)
+
+    def build(self, context):
+        vertices = self.import_as_terrain(context)
+        rows, columns = self.samples
+        self.report({'INFO'}, f"Terrain built from {columns}x{rows} elevation samples with {vertices} vertices")
 
-    def import_as_displacement(self, context):
+    def import_as_terrain(self, context):
         extent_obj = bpy.data.objects.get("qgis_extent")
         if not extent_obj:
             raise ValueError("qgis_extent object not found")
-
-        displaced_obj = extent_obj.copy()
-        displaced_obj.data = extent_obj.data.copy()
-        displaced_obj.name = "qgis_extent_displaced"
-        bpy.context.scene.collection.objects.link(displaced_obj)
-
-        response = requests.get(f'{context.scene.qgis_server_url}/snapshot')
-        if response.status_code != 200:
-            raise ValueError(f"Failed to fetch snapshot: HTTP {response.status_code}")
-
-        data = response.json()
-        image_data = base64.b64decode(data['image'])
-
-        image_name = "QGISSnapshot"
-        if image_name in bpy.data.images:
-            bpy_image = bpy.data.images[image_name]
-            bpy_image.scale(data['width'], data['height'])
-        else:
-            bpy_image = bpy.data.images.new(image_name, width=data['width'], height=data['height'])
-        bpy_image.pack(data=image_data, data_len=len(image_data))
-        bpy_image.source = 'FILE'
-        bpy_image.reload()
-
-        # Calculate subdivisions based on aspect ratio
-        width = extent_obj.dimensions.x
-        height = extent_obj.dimensions.y
-        aspect_ratio = width / height
-        min_divisions = 10
-
-        if aspect_ratio >= 1:
-            x_divisions = max(min_divisions, math.ceil(min_divisions * aspect_ratio))
-            y_divisions = min_divisions
+        vertices, uvs, face_sizes, loop_vertices = self.terrain
+
+        mesh = bpy.data.meshes.new("qgis_terrain")
+        fill_mesh(mesh, vertices, face_sizes, loop_vertices=loop_vertices)
+        uv_layer = mesh.uv_layers.new(name="UVMap")
+        uv_layer.data.foreach_set('uv', uvs[loop_vertices].astype(np.float32).ravel())
+        mesh.polygons.foreach_set('use_smooth', np.ones(len(mesh.polygons), dtype=bool))
+        # Drape the canvas snapshot of the extent rectangle over the terrain
+        for material in extent_obj.data.materials:
+            mesh.materials.append(material)
+
+        terrain_obj = bpy.data.objects.get("qgis_extent_displaced")
+        if terrain_obj:
+            previous = terrain_obj.data
+            terrain_obj.data = mesh
+            # Terrains built before heights were baked carried a subdivision and displacement chain
+            terrain_obj.modifiers.clear()
+            terrain_obj.location, terrain_obj.rotation_euler, terrain_obj.scale = (0, 0, 0), (0, 0, 0), (1, 1, 1)
+            if previous.users == 0:
+                bpy.data.meshes.remove(previous)
         else:
-            x_divisions = min_divisions
-            y_divisions = max(min_divisions, math.ceil(min_divisions / aspect_ratio))
-
-        # Create new bmesh
-        bm = bmesh.new()
-        bmesh.ops.create_grid(bm, x_segments=x_divisions, y_segments=y_divisions, size=1)
-
-        # Apply bmesh to object
-        bm.to_mesh(displaced_obj.data)
-        bm.free()
-
-        # Scale to match original dimensions
-        displaced_obj.dimensions = (width, height, 0)
-
-        # Ensure proper UV mapping
-        bpy.context.view_layer.objects.active = displaced_obj
-        bpy.ops.object.mode_set(mode='EDIT')
-        bpy.ops.uv.unwrap()
-        bpy.ops.object.mode_set(mode='OBJECT')
-
-        # Apply subdivision modifier for additional detail
-        subdiv_mod = displaced_obj.modifiers.new(name="Subdivision", type='SUBSURF')
-        subdiv_mod.subdivision_type = 'SIMPLE'
-        subdiv_mod.levels = 2
-        subdiv_mod.render_levels = 4
-
-        # Apply displacement modifier
-        disp_mod = displaced_obj.modifiers.new(name="Displacement", type='DISPLACE')
-        disp_mod.texture_coords = 'UV'
-        disp_mod.strength = self.displacement_strength
-
-        texture = bpy.data.textures.new("DisplacementTexture", type='IMAGE')
-        texture.image = bpy_image
-        disp_mod.texture = texture
-
-        # Ensure the displaced object matches the extent object's size
-        displaced_obj.dimensions = extent_obj.dimensions
-
-        self.report({'INFO'}, "Displacement map applied")
+            terrain_obj = bpy.data.objects.new("qgis_extent_displaced", mesh)
+            context.scene.collection.objects.link(terrain_obj)
+        leftovers = [texture for texture in bpy.data.textures if texture.name.startswith("DisplacementTexture")]
+        leftovers += [image for image in bpy.data.images if image.name.startswith("QGISElevation")]
+        leftovers = [datablock for datablock in leftovers if datablock.users == 0]
+        if leftovers:
+            bpy.data.batch_remove(leftovers)
+        return len(vertices)
 
 
 def register():
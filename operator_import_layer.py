@@ -1,77 +1,206 @@
-import bmesh
 import bpy
-import requests
-import base64
+import numpy as np
+import time
 from bpy.props import StringProperty
 from bpy.types import Operator
-
-from .utils import error_handler, add_custom_properties
-
-class QGIS_OT_import_layer(Operator):
+from mathutils.geometry import tessellate_polygon
+
+from .cache import cached_get
+from .client import QGISServerError, check_json_error, executor
+from .layer_data import decode_layer_data
+from .modal import BackgroundOperator
+from .utils import (add_attribute_lookups, add_custom_properties, add_feature_attributes, add_feature_ids,
+                    fids_fit, fill_mesh, remove_layer_collection, store_fid_table, visible_extent_bbox)
+
+class LayerDownload:
+    """A layer's data and style request, fetched on a worker thread without touching bpy."""
+
+    def __init__(self, layer_id, layer_name, server_url, params, headers, settings, timeout):
+        self.layer_id = layer_id
+        self.layer_name = layer_name
+        self.server_url = server_url
+        self.params = params
+        self.headers = headers
+        self.settings = settings
+        self.timeout = timeout
+        self.seconds = 0.0
+
+    def fetch(self, cancel=None, progress=None):
+        started = time.perf_counter()
+        # The style is only needed once the data is in, so it is fetched alongside
+        style = executor.submit(cached_get, self.server_url, f'/layerstyle/{self.layer_id}', timeout=self.timeout)
+        response = cached_get(self.server_url, f'/layer/{self.layer_id}', params=self.params, headers=self.headers,
+                              timeout=self.timeout, cancel=cancel, progress=progress)
+        self.status_code = response.status_code
+        self.source = response.source
+        self.etag = response.headers.get('ETag', '')
+        self.revision = int(response.headers.get('X-Layer-Revision', 0))
+        self.session = response.headers.get('X-Server-Session', '')
+        if response.status_code != 304:
+            check_json_error(response, f"Failed to export {self.layer_name}")
+            response.raise_for_status()
+            self.layer_data = decode_layer_data(response.content)
+            self.columns = self.layer_data.attribute_columns()
+            self.style = style.result().json()
+        self.seconds = time.perf_counter() - started
+
+
+class QGIS_OT_import_layer(BackgroundOperator, Operator):
     bl_idname = "qgis.import_layer"
     bl_label = "Import"
     bl_description = "Import selected layer from QGIS"
 
     layer_id: StringProperty()
 
-    @error_handler
-    def execute(self, context):
-        # Retrieve layer data from QGIS server
-        response = requests.get(f'{context.scene.qgis_server_url}/layer/{self.layer_id}')
-        data = response.json()
-        if 'error' in data:
-            self.report({'ERROR'}, data['error'])
-            return {'CANCELLED'}
-
-        features = data.get('features', [])
-        layer = next((layer for layer in context.scene.qgis_layers if layer.layer_id == self.layer_id), None)
+    def find_layer(self, context, layer_id=None):
+        layer_id = layer_id or self.layer_id
+        return next((layer for layer in context.scene.qgis_layers if layer.layer_id == layer_id), None)
+
+    def prepare(self, context):
+        layer = self.find_layer(context)
         if not layer:
             self.report({'ERROR'}, "Layer not found")
-            return {'CANCELLED'}
-
-        # Remove existing collection if it exists
-        existing_collection = bpy.data.collections.get(layer.name)
-        if existing_collection:
-            bpy.ops.object.select_all(action='DESELECT')
-            for obj in existing_collection.objects:
-                bpy.context.view_layer.objects.active = obj
-                obj.select_set(True)
-                bpy.ops.object.delete()
-            bpy.data.collections.remove(existing_collection)
+            return False
+        self.download = self.plan_download(context, layer)
+        self.collection_name = None
+        return self.download is not None
+
+    def plan_download(self, context, layer):
+        # Everything the worker thread needs for one layer, copied out of bpy
+        layer_type = layer.type.lower()
+        if layer_type in ["raster", "displacement"]:
+            self.report({'INFO'}, "Raster/Displacement layers are not imported directly")
+            return None
+        if not any(kind in layer_type for kind in ("point", "linestring", "polygon")):
+            self.report({'WARNING'}, f"Unsupported layer type: {layer.type}")
+            return None
+
+        params = self.request_params(context, layer)
+        if params is None:
+            return None
+
+        # Ask for a 304 when the layer was built from the same data with the same settings
+        headers = {}
+        settings = self.import_settings(context, layer, params)
+        if layer.etag and layer.import_settings == settings and bpy.data.collections.get(layer.name):
+            headers['If-None-Match'] = layer.etag
+        return LayerDownload(layer.layer_id, layer.name, context.scene.qgis_server_url, params, headers, settings,
+                             context.scene.qgis_timeout)
+
+    def request_params(self, context, layer):
+        # Query parameters selecting the layer data to retrieve from the QGIS server
+        params = {'format': 'binary'}
+        if layer.visible_extent_only:
+            bbox = visible_extent_bbox(context)
+            if not bbox:
+                self.report({'ERROR'}, "qgis_extent object not found")
+                return None
+            params['bbox'] = bbox
+        if layer.fields.strip():
+            params['fields'] = layer.fields
+        if layer.simplify:
+            render = context.scene.render
+            params['lod'] = 'auto'
+            params['resolution'] = str(render.resolution_x * render.resolution_percentage // 100)
+        return params
+
+    def fetch(self):
+        download = self.download
+        self.set_status(f"Requesting {download.layer_name}")
+        download.fetch(self._cancel, lambda size: self.set_status(
+            f"Downloading {download.layer_name}: {size / 1e6:.1f} MB"))
+
+    def cleanup(self, context):
+        # Drop a partially built layer
+        if self.collection_name:
+            remove_layer_collection(self.collection_name)
+
+    def build(self, context):
+        message = yield from self.build_layer(context, self.download)
+        self.report({'INFO'}, message)
+
+    def build_layer(self, context, download):
+        # Replace the layer's collection with the downloaded features; returns a summary of the import
+        if download.status_code == 304:
+            return f"{download.layer_name} is unchanged"
+        layer = self.find_layer(context, download.layer_id)
+        if not layer:
+            raise QGISServerError("Layer not found")
+        layer_data = download.layer_data
+
+        # Remove the previous import of the layer with everything it owned
+        remove_layer_collection(layer.name)
 
         # Create new collection for the layer
         layer_collection = bpy.data.collections.new(layer.name)
         bpy.context.scene.collection.children.link(layer_collection)
-
-        qgis_offset = context.scene.qgis_offset
-
-        # Retrieve layer style from QGIS server
-        style_response = requests.get(f'{context.scene.qgis_server_url}/layerstyle/{self.layer_id}')
-        style_data = style_response.json()
-        fill_color = style_data.get('color', '#ffffff')
-        fill_color_rgba = self.hex_to_rgba(fill_color)
-
-        # Import features based on type
-        if "point" in layer.type.lower():
-            if layer.make_spheres:
-                self.import_as_spheres(context, features, layer.sphere_radius, layer.sphere_u_segments,
-                                       layer.sphere_v_segments, layer.name, layer_collection, qgis_offset,
-                                       fill_color_rgba)
+        self.collection_name = layer_collection.name
+
+        add_attribute_lookups(layer_collection, download.columns)
+        if not fids_fit(layer_data.feature_ids):
+            store_fid_table(layer_collection, np.unique(layer_data.feature_ids))
+        fill_color_rgba = self.hex_to_rgba(download.style.get('color', '#ffffff'))
+        yield from self.import_features(context, layer, layer_data, download.columns, layer_collection,
+                                        fill_color_rgba)
+        self.collection_name = None
+
+        # The layer list may have been refreshed while building
+        layer = self.find_layer(context, download.layer_id)
+        if layer:
+            layer.etag = download.etag
+            layer.import_settings = download.settings
+            layer.revision = download.revision
+            layer.server_session = download.session
+        message = f"Imported {layer_data.feature_count} of {layer_data.header.get('total')} features"
+        simplification = layer_data.header.get('simplification')
+        if simplification:
+            message += f", simplified from {simplification['vertices_in']} to {simplification['vertices_out']} vertices"
+        if download.source == 'offline':
+            message += " from the local cache, QGIS is not reachable"
+        return message
+
+    def import_features(self, context, layer, layer_data, columns, layer_collection, fill_color_rgba):
+        # Build the features based on the layer type; builders making one object per feature yield their progress
+        layer_type = layer.type.lower()
+        layer_name = layer.name
+        qgis_offset = np.array(context.scene.qgis_offset)
+        # Merged builds always store fields as attributes, separate objects only when asked to
+        object_columns = columns if layer.attribute_storage == 'GEOMETRY' else None
+
+        if "point" in layer_type:
+            if layer.make_spheres and layer.instance_spheres:
+                self.import_as_sphere_instances(context, layer_data, columns, layer.sphere_radius,
+                                                layer.sphere_u_segments, layer.sphere_v_segments,
+                                                layer.sphere_scale_field.strip(), layer_name, layer_collection,
+                                                qgis_offset, fill_color_rgba)
+            elif layer.make_spheres:
+                yield from self.import_as_spheres(context, layer_data, object_columns, layer.sphere_radius,
+                                                  layer.sphere_u_segments, layer.sphere_v_segments, layer_name,
+                                                  layer_collection, qgis_offset, fill_color_rgba)
+            elif layer.single_object:
+                self.import_as_point_mesh(context, layer_data, columns, layer_name, layer_collection, qgis_offset,
+                                          fill_color_rgba)
             else:
-                self.import_as_vertices(context, features, layer.name, layer_collection, qgis_offset, fill_color_rgba)
-        elif "linestring" in layer.type.lower():
-            self.import_as_lines(context, features, layer.name, layer_collection, qgis_offset, fill_color_rgba)
-        elif "polygon" in layer.type.lower():
-            self.import_as_polygons(context, features, layer.name, layer_collection, qgis_offset, fill_color_rgba)
-        elif layer.type.lower() in ["raster", "displacement"]:
-            self.report({'INFO'}, "Raster/Displacement layers are not imported directly")
-            return {'CANCELLED'}
+                yield from self.import_as_vertices(context, layer_data, object_columns, layer_name,
+                                                   layer_collection, qgis_offset, fill_color_rgba)
+        elif "linestring" in layer_type and layer.single_object:
+            self.import_as_line_mesh(context, layer_data, columns, layer_name, layer_collection, qgis_offset,
+                                     fill_color_rgba)
+        elif "linestring" in layer_type:
+            yield from self.import_as_lines(context, layer_data, layer_name, layer_collection, qgis_offset,
+                                            fill_color_rgba)
+        elif layer.single_object:
+            self.import_as_polygon_mesh(context, layer_data, columns, layer_name, layer_collection, qgis_offset,
+                                        fill_color_rgba)
         else:
-            self.report({'WARNING'}, f"Unsupported layer type: {layer.type}")
-            return {'CANCELLED'}
+            yield from self.import_as_polygons(context, layer_data, object_columns, layer_name, layer_collection,
+                                               qgis_offset, fill_color_rgba)
 
-        self.report({'INFO'}, f"Imported {len(features)} features")
-        return {'FINISHED'}
+    def import_settings(self, context, layer, params):
+        # The request parameters and everything besides the server response that shapes the imported objects
+        return repr((sorted(params.items()), tuple(context.scene.qgis_offset), layer.single_object,
+                     layer.make_spheres, layer.instance_spheres, layer.sphere_scale_field, layer.sphere_radius,
+                     layer.sphere_u_segments, layer.sphere_v_segments, layer.attribute_storage))
 
     def hex_to_rgba(self, hex_color):
         hex_color = hex_color.lstrip('#')
@@ -82,49 +211,131 @@ class QGIS_OT_import_layer(Operator):
             return tuple(int(hex_color[i:i + 2], 16) / 255 for i in range(0, 8, 2))
         return 1.0, 1.0, 1.0, 1.0  # default white color
 
-    def apply_offset(self, coords, offset):
-        return [coords[0] - offset[0], coords[1] - offset[1], coords[2] - offset[2] if len(coords) > 2 else 0]
-
     def create_material(self, name, color):
-        mat = bpy.data.materials.new(name=name)
+        # Shared by every object of the layer, including ones added by later updates
+        mat = bpy.data.materials.get(name)
+        if mat is None:
+            mat = bpy.data.materials.new(name=name)
         mat.use_nodes = True
         bsdf = mat.node_tree.nodes["Principled BSDF"]
         bsdf.inputs["Base Color"].default_value = color
         return mat
 
-    def import_as_vertices(self, context, features, layer_name, layer_collection, offset, color):
+    def store_attributes(self, obj, layer_data, index, attributes, columns, domain, count):
+        # Custom properties on the object, or the feature's row repeated over count elements of its mesh
+        # qgis_fid ties the object to its feature for updates; ids beyond 32 bits are kept as strings
+        fid = int(layer_data.feature_ids[index])
+        obj["qgis_fid"] = fid if fids_fit([fid]) else str(fid)
+        if columns is None:
+            add_custom_properties(obj, attributes)
+        else:
+            add_feature_attributes(obj.data, domain, columns, np.full(count, index))
+
+    def import_as_vertices(self, context, layer_data, columns, layer_name, layer_collection, offset, color):
         mat = self.create_material(f"{layer_name}_material", color)
-        for index, feature in enumerate(features):
-            coords = self.apply_offset(feature['geometry']['coordinates'], offset)
+        for index in range(layer_data.feature_count):
+            start, end = layer_data.feature_vertex_range(index)
+            attributes = layer_data.feature_attributes(index)
             mesh = bpy.data.meshes.new(f"{layer_name}.point.{index}")
             obj = bpy.data.objects.new(f"{layer_name}.point.{index}", mesh)
             obj.data.materials.append(mat)
-            if 'name' in feature['attributes']:
-                obj.name = f"{layer_name}.point.{feature['attributes']['name']}"
+            if 'name' in attributes:
+                obj.name = f"{layer_name}.point.{attributes['name']}"
 
-            bm = bmesh.new()
-            bm.verts.new(coords)
-            bm.to_mesh(mesh)
-            bm.free()
+            fill_mesh(mesh, layer_data.coordinates[start:end] - offset)
 
             layer_collection.objects.link(obj)
             bpy.context.view_layer.update()
 
-            add_custom_properties(obj, feature['attributes'])
-
-    def import_as_spheres(self, context, features, radius, u_segs, v_segs, layer_name, layer_collection, offset, color):
+            self.store_attributes(obj, layer_data, index, attributes, columns, 'POINT', end - start)
+            yield (index + 1) / layer_data.feature_count
+
+    def import_as_point_mesh(self, context, layer_data, columns, layer_name, layer_collection, offset, color):
+        # One vertex per point for the whole layer, traced back to QGIS through the feature_id attribute
+        feature_index = layer_data.vertex_feature_index()
+        mesh = bpy.data.meshes.new(f"{layer_name}.points")
+        fill_mesh(mesh, layer_data.coordinates - offset)
+        add_feature_ids(mesh, 'POINT', layer_data.feature_ids[feature_index], layer_collection)
+        add_feature_attributes(mesh, 'POINT', columns, feature_index)
+        mesh.materials.append(self.create_material(f"{layer_name}_material", color))
+
+        obj = bpy.data.objects.new(f"{layer_name}.points", mesh)
+        layer_collection.objects.link(obj)
+
+    def import_as_sphere_instances(self, context, layer_data, columns, radius, u_segs, v_segs, scale_field, layer_name,
+                                   layer_collection, offset, color):
+        # A single point cloud; the spheres only exist as instances of one mesh evaluated by Geometry Nodes
+        feature_index = layer_data.vertex_feature_index()
+        mesh = bpy.data.meshes.new(f"{layer_name}.points")
+        fill_mesh(mesh, layer_data.coordinates - offset)
+        add_feature_ids(mesh, 'POINT', layer_data.feature_ids[feature_index], layer_collection)
+        if scale_field:
+            kind, values, valid = layer_data.attributes.get(scale_field, (None, None, None))
+            if kind not in ('int', 'float'):
+                raise ValueError(f"Scale field {scale_field} is not a numeric attribute of the layer")
+            scale = mesh.attributes.new(scale_field, 'FLOAT', 'POINT')
+            scale.data.foreach_set('value', np.where(valid, values, 1.0).astype(np.float32)[feature_index])
+        add_feature_attributes(mesh, 'POINT', columns, feature_index)
+
+        obj = bpy.data.objects.new(f"{layer_name}.spheres", mesh)
+        modifier = obj.modifiers.new("Spheres", 'NODES')
+        modifier.node_group = self.create_sphere_instancer(f"{layer_name}_spheres",
+                                                           self.create_material(f"{layer_name}_material", color))
+        inputs = {item.name: item.identifier for item in modifier.node_group.interface.items_tree
+                  if item.item_type == 'SOCKET' and item.in_out == 'INPUT'}
+        modifier[inputs["Radius"]] = radius
+        modifier[inputs["Segments"]] = v_segs
+        modifier[inputs["Rings"]] = u_segs
+        if scale_field:
+            modifier[inputs["Scale"] + "_use_attribute"] = True
+            modifier[inputs["Scale"] + "_attribute_name"] = scale_field
+        layer_collection.objects.link(obj)
+
+    def create_sphere_instancer(self, name, material):
+        if name in bpy.data.node_groups:
+            return bpy.data.node_groups[name]
+        group = bpy.data.node_groups.new(name, 'GeometryNodeTree')
+        group.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
+        group.interface.new_socket("Radius", in_out='INPUT', socket_type='NodeSocketFloat')
+        group.interface.new_socket("Segments", in_out='INPUT', socket_type='NodeSocketInt')
+        group.interface.new_socket("Rings", in_out='INPUT', socket_type='NodeSocketInt')
+        scale = group.interface.new_socket("Scale", in_out='INPUT', socket_type='NodeSocketFloat')
+        scale.default_value = 1.0
+        group.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
+
+        nodes, links = group.nodes, group.links
+        group_input = nodes.new('NodeGroupInput')
+        group_output = nodes.new('NodeGroupOutput')
+        sphere = nodes.new('GeometryNodeMeshUVSphere')
+        set_material = nodes.new('GeometryNodeSetMaterial')
+        set_material.inputs['Material'].default_value = material
+        instance = nodes.new('GeometryNodeInstanceOnPoints')
+
+        links.new(group_input.outputs['Radius'], sphere.inputs['Radius'])
+        links.new(group_input.outputs['Segments'], sphere.inputs['Segments'])
+        links.new(group_input.outputs['Rings'], sphere.inputs['Rings'])
+        links.new(sphere.outputs['Mesh'], set_material.inputs['Geometry'])
+        links.new(group_input.outputs['Geometry'], instance.inputs['Points'])
+        links.new(set_material.outputs['Geometry'], instance.inputs['Instance'])
+        links.new(group_input.outputs['Scale'], instance.inputs['Scale'])
+        links.new(instance.outputs['Instances'], group_output.inputs['Geometry'])
+        return group
+
+    def import_as_spheres(self, context, layer_data, columns, radius, u_segs, v_segs, layer_name, layer_collection,
+                          offset, color):
         mat = self.create_material(f"{layer_name}_material", color)
 
         if layer_collection.name not in bpy.context.scene.collection.children:
             bpy.context.scene.collection.children.link(layer_collection)
 
-        for index, feature in enumerate(features):
-            coords = self.apply_offset(feature['geometry']['coordinates'], offset)
+        for index in range(layer_data.feature_count):
+            start, end = layer_data.feature_vertex_range(index)
+            attributes = layer_data.feature_attributes(index)
             bpy.ops.mesh.primitive_uv_sphere_add(
                 segments=v_segs,
                 ring_count=u_segs,
                 radius=radius,
-                location=coords
+                location=tuple(layer_data.coordinates[start] - offset)
             )
             sphere_obj = context.active_object
             sphere_obj.data.materials.append(mat)
@@ -134,71 +345,111 @@ class QGIS_OT_import_layer(Operator):
             layer_collection.objects.link(sphere_obj)
 
             sphere_obj.name = f"{layer_name}.point.{index}"
-            if 'name' in feature['attributes']:
-                sphere_obj.name = f"{layer_name}.point.{feature['attributes']['name']}"
+            if 'name' in attributes:
+                sphere_obj.name = f"{layer_name}.point.{attributes['name']}"
 
-            add_custom_properties(sphere_obj, feature['attributes'])
+            self.store_attributes(sphere_obj, layer_data, index, attributes, columns, 'POINT',
+                                  len(sphere_obj.data.vertices))
+            yield (index + 1) / layer_data.feature_count
 
         bpy.context.view_layer.update()
 
-    def import_as_lines(self, context, features, layer_name, layer_collection, offset, color):
+    def import_as_lines(self, context, layer_data, layer_name, layer_collection, offset, color):
         mat = self.create_material(f"{layer_name}_material", color)
-        for index, feature in enumerate(features):
-            coords = feature['geometry']['coordinates']
+        for index in range(layer_data.feature_count):
+            attributes = layer_data.feature_attributes(index)
             curve_data = bpy.data.curves.new(name=f"{layer_name}.curve.{index}", type='CURVE')
             curve_data.dimensions = '3D'
 
-            if isinstance(coords[0][0], list):
-                for line in coords:
+            for part in layer_data.feature_parts(index):
+                for start, end in part:
+                    points = np.ones((end - start, 4), dtype=np.float32)
+                    points[:, :3] = layer_data.coordinates[start:end] - offset
                     polyline = curve_data.splines.new('POLY')
-                    polyline.points.add(len(line) - 1)
-                    for i, point in enumerate(line):
-                        point = self.apply_offset(point, offset)
-                        polyline.points[i].co = (point[0], point[1], point[2] if len(point) > 2 else 0, 1.0)
-            else:
-                polyline = curve_data.splines.new('POLY')
-                polyline.points.add(len(coords) - 1)
-                for i, point in enumerate(coords):
-                    point = self.apply_offset(point, offset)
-                    polyline.points[i].co = (point[0], point[1], point[2] if len(point) > 2 else 0, 1.0)
+                    polyline.points.add(len(points) - 1)
+                    polyline.points.foreach_set('co', points.ravel())
 
             curve_obj = bpy.data.objects.new(f"{layer_name}.line.{index}", curve_data)
             curve_obj.data.materials.append(mat)
             layer_collection.objects.link(curve_obj)
             bpy.context.view_layer.update()
 
-            if 'name' in feature['attributes']:
-                curve_obj.name = f"{layer_name}.line.{feature['attributes']['name']}"
+            if 'name' in attributes:
+                curve_obj.name = f"{layer_name}.line.{attributes['name']}"
+
+            self.store_attributes(curve_obj, layer_data, index, attributes, None, None, 0)
+            yield (index + 1) / layer_data.feature_count
 
-            add_custom_properties(curve_obj, feature['attributes'])
+    def import_as_line_mesh(self, context, layer_data, columns, layer_name, layer_collection, offset, color):
+        # All lines as the edges of one mesh (Object > Convert > Curve turns it into curves);
+        # feature attributes are stored per edge
+        edges = layer_data.line_edges()
+        mesh = bpy.data.meshes.new(f"{layer_name}.lines")
+        fill_mesh(mesh, layer_data.coordinates - offset, edges=edges)
+        edge_features = layer_data.vertex_feature_index()[edges[:, 0]]
+        add_feature_ids(mesh, 'EDGE', layer_data.feature_ids[edge_features], layer_collection)
+        add_feature_attributes(mesh, 'EDGE', columns, edge_features)
+        mesh.materials.append(self.create_material(f"{layer_name}_material", color))
 
-    def import_as_polygons(self, context, features, layer_name, layer_collection, offset, color):
+        obj = bpy.data.objects.new(f"{layer_name}.lines", mesh)
+        layer_collection.objects.link(obj)
+
+    def import_as_polygons(self, context, layer_data, columns, layer_name, layer_collection, offset, color):
         mat = self.create_material(f"{layer_name}_material", color)
-        for index, feature in enumerate(features):
-            coords = feature['geometry']['coordinates']
+        for index in range(layer_data.feature_count):
+            attributes = layer_data.feature_attributes(index)
             mesh = bpy.data.meshes.new(f"{layer_name}.polygon.{index}")
             obj = bpy.data.objects.new(f"{layer_name}.polygon.{index}", mesh)
             obj.data.materials.append(mat)
-            bm = bmesh.new()
-
-            if isinstance(coords[0][0], (int, float)):
-                coords = [coords]
-
-            for poly in coords:
-                verts = [bm.verts.new(self.apply_offset(p, offset)) for p in poly[0]]
-                bm.faces.new(verts)
 
-            bm.to_mesh(mesh)
-            bm.free()
+            # Only the exterior ring of each part becomes a face
+            rings = [layer_data.open_ring(*part[0]) for part in layer_data.feature_parts(index) if part]
+            vertices = [layer_data.coordinates[start:end] for start, end in rings]
+            if vertices:
+                fill_mesh(mesh, np.concatenate(vertices) - offset, [end - start for start, end in rings])
 
             layer_collection.objects.link(obj)
             bpy.context.view_layer.update()
 
-            if 'name' in feature['attributes']:
-                obj.name = f"{layer_name}.polygon.{feature['attributes']['name']}"
-
-            add_custom_properties(obj, feature['attributes'])
-
+            if 'name' in attributes:
+                obj.name = f"{layer_name}.polygon.{attributes['name']}"
+
+            self.store_attributes(obj, layer_data, index, attributes, columns, 'FACE', len(mesh.polygons))
+            yield (index + 1) / layer_data.feature_count
+
+    def import_as_polygon_mesh(self, context, layer_data, columns, layer_name, layer_collection, offset, color):
+        # Every part without holes becomes one n-gon, all in one pass; parts with holes are triangulated
+        keep, ring_offsets = layer_data.open_rings()
+        vertices = layer_data.coordinates[keep] - offset
+        ring_sizes = np.diff(ring_offsets)
+        part_features = np.repeat(np.arange(layer_data.feature_count), np.diff(layer_data.feature_offsets))
+        part_rings = layer_data.part_offsets[:-1]
+        ring_counts = np.diff(layer_data.part_offsets)
+
+        simple = (ring_counts == 1) & (ring_sizes[part_rings] >= 3)
+        face_sizes = ring_sizes[part_rings[simple]]
+        loop_starts = ring_offsets[part_rings[simple]]
+        loop_shift = np.repeat(loop_starts - (np.cumsum(face_sizes) - face_sizes), face_sizes)
+        loops = [loop_shift + np.arange(face_sizes.sum())]
+        face_features = [part_features[simple]]
+
+        for part in np.flatnonzero(ring_counts > 1):
+            rings = range(part_rings[part], part_rings[part] + ring_counts[part])
+            outlines = [vertices[ring_offsets[ring]:ring_offsets[ring + 1]].tolist() for ring in rings]
+            triangles = np.array(tessellate_polygon(outlines), dtype=np.int64).reshape(-1, 3)
+            loops.append(triangles.ravel() + ring_offsets[part_rings[part]])
+            face_features.append(np.full(len(triangles), part_features[part]))
+
+        face_features = np.concatenate(face_features)
+        mesh = bpy.data.meshes.new(f"{layer_name}.polygons")
+        fill_mesh(mesh, vertices, np.concatenate([face_sizes, np.full(len(face_features) - len(face_sizes), 3)]),
+                  loop_vertices=np.concatenate(loops))
+        add_feature_ids(mesh, 'FACE', layer_data.feature_ids[face_features], layer_collection)
+        add_feature_attributes(mesh, 'FACE', columns, face_features)
+        mesh.materials.append(self.create_material(f"{layer_name}_material", color))
+
+        obj = bpy.data.objects.new(f"{layer_name}.polygons", mesh)
+        layer_collection.objects.link(obj)
 
 
 def register():
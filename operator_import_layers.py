@@ -0,0 +1,90 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bpy
+from bpy.props import BoolProperty
+
+from .client import REQUEST_WORKERS
+from .operator_import_layer import QGIS_OT_import_layer
+from .utils import error_message, remove_layer_collection
+
+
+class QGIS_OT_import_layers(QGIS_OT_import_layer):
+    bl_idname = "qgis.import_layers"
+    bl_label = "Import Layers"
+    bl_description = "Import the selected layers from QGIS, downloading them concurrently"
+
+    all_layers: BoolProperty(
+        name="All layers",
+        description="Import every vector layer instead of the selected ones",
+        default=False,
+    )
+
+    def prepare(self, context):
+        layers = [layer for layer in context.scene.qgis_layers
+                  if (self.all_layers or layer.selected)
+                  and any(kind in layer.type.lower() for kind in ("point", "linestring", "polygon"))]
+        if not layers:
+            self.report({'WARNING'}, "No vector layers selected")
+            return False
+        self.downloads = [download for download in (self.plan_download(context, layer) for layer in layers)
+                          if download is not None]
+        self.collection_name = None
+        self.pool = None
+        self.started = time.perf_counter()
+        return bool(self.downloads)
+
+    def fetch(self):
+        # Only queue the downloads; build picks up each layer as soon as its payload is in
+        self.set_status(f"Downloading {len(self.downloads)} layers")
+        self.pool = ThreadPoolExecutor(max_workers=REQUEST_WORKERS, thread_name_prefix='qgis-import')
+        self.futures = [(self.pool.submit(download.fetch, self._cancel), download) for download in self.downloads]
+
+    def cleanup(self, context):
+        super().cleanup(context)
+        if self.pool:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def build(self, context):
+        pending = list(self.futures)
+        results = []
+        while pending:
+            ready = [item for item in pending if item[0].done()]
+            if not ready:
+                self.set_status(f"Downloaded {len(self.futures) - len(pending)} of {len(self.futures)} layers, "
+                                f"built {len(results)}")
+                yield None
+                continue
+            for item in ready:
+                pending.remove(item)
+                future, download = item
+                self.set_status(f"Building {download.layer_name}")
+                try:
+                    future.result()
+                    results.append((download, True, (yield from self.build_layer(context, download))))
+                except Exception as e:
+                    # One failed layer does not stop the others
+                    if self.collection_name:
+                        remove_layer_collection(self.collection_name)
+                        self.collection_name = None
+                    results.append((download, False, error_message(e)))
+        self.pool.shutdown(wait=False)
+
+        for download, imported, message in results:
+            self.report({'INFO'} if imported else {'WARNING'},
+                        f"{download.layer_name}: {message} ({download.seconds:.1f} s download)")
+        imported = sum(1 for _, ok, _ in results if ok)
+        self.report({'INFO'}, f"Imported {imported} of {len(results)} layers in "
+                              f"{time.perf_counter() - self.started:.1f} s")
+
+
+def register():
+    bpy.utils.register_class(QGIS_OT_import_layers)
+
+
+def unregister():
+    bpy.utils.unregister_class(QGIS_OT_import_layers)
+
+
+if __name__ == "__main__":
+    register()
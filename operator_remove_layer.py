@@ -0,0 +1,37 @@
+import bpy
+from bpy.props import StringProperty
+from bpy.types import Operator
+from .utils import error_handler, remove_layer_collection
+
+
+class QGIS_OT_remove_layer(Operator):
+    bl_idname = "qgis.remove_layer"
+    bl_label = "Remove"
+    bl_description = "Remove the imported layer and the data it owned from the scene"
+
+    layer_id: StringProperty()
+
+    @error_handler
+    def execute(self, context):
+        layer = next((layer for layer in context.scene.qgis_layers if layer.layer_id == self.layer_id), None)
+        if not layer:
+            self.report({'ERROR'}, "Layer not found")
+            return {'CANCELLED'}
+
+        remove_layer_collection(layer.name)
+        layer.etag = ""
+        layer.import_settings = ""
+        self.report({'INFO'}, f"Removed {layer.name}")
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(QGIS_OT_remove_layer)
+
+
+def unregister():
+    bpy.utils.unregister_class(QGIS_OT_remove_layer)
+
+
+if __name__ == "__main__":
+    register()
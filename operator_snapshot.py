@@ -1,12 +1,22 @@
-import base64
-
 import bpy
-import requests
+import numpy as np
+from bpy.app.handlers import persistent
 from bpy.types import Operator
+from .cache import cached_get
+from .client import check_json_error
+from .modal import BackgroundOperator
+from .utils import snapshot_params
+
+SNAPSHOT_IMAGE = "QGISSnapshot"
+SNAPSHOT_MATERIAL = "QGISSnapshotMaterial"
+# Custom property marking a snapshot image this add-on packed on save, which later updates keep using
+PACKED_SNAPSHOT = "qgis_packed_snapshot"
+# Custom property holding the ETag of the pixels in the snapshot image
+SNAPSHOT_ETAG = "qgis_etag"
 
 
 # Operator to update the QGIS map snapshot
-class QGIS_OT_update_snapshot(Operator):
+class QGIS_OT_update_snapshot(BackgroundOperator, Operator):
     bl_idname = "qgis.update_snapshot"
     bl_label = "Update Snapshot"
     bl_description = "Update the QGIS map snapshot"
@@ -15,65 +25,120 @@ class QGIS_OT_update_snapshot(Operator):
     def poll(cls, context):
         return context.scene.qgis_linked
 
-    def execute(self, context):
-        # Fetch the snapshot from the QGIS server
-        response = requests.get(f'{context.scene.qgis_server_url}/snapshot')
-        data = response.json()
-
-        # Decode the base64 image
-        image_data = base64.b64decode(data['image'])
-
-        # Create or get the image in Blender
-        image_name = "QGISSnapshot"
-        if image_name in bpy.data.images:
-            bpy_image = bpy.data.images[image_name]
-        else:
-            bpy_image = bpy.data.images.new(image_name, width=8, height=8)  # Dummy size
-
-        # Pack the image data
-        bpy_image.pack(data=image_data, data_len=len(image_data))
-
-        # Switch to file source so it uses the packed file
-        bpy_image.source = 'FILE'
-
-        # Reload to refresh
-        bpy_image.reload()
-
-        # Create material and assign it to the QGIS extent rectangle
-        mat_name = "QGISSnapshotMaterial"
-        if mat_name in bpy.data.materials:
-            mat = bpy.data.materials[mat_name]
+    def prepare(self, context):
+        self.request = (context.scene.qgis_server_url, snapshot_params(context), context.scene.qgis_timeout)
+        # The image is the only copy of the pixels; they are not kept in the download cache
+        bpy_image = bpy.data.images.get(SNAPSHOT_IMAGE)
+        self.etag = bpy_image.get(SNAPSHOT_ETAG, '') if bpy_image else ''
+        return True
+
+    def fetch(self):
+        # Fetch the raw bottom-up RGBA pixels and scale them into the reused float buffer
+        server_url, params, timeout = self.request
+        self.set_status("Rendering in QGIS")
+        response = cached_get(server_url, '/snapshot.rgba', params=params,
+                              headers={'If-None-Match': self.etag} if self.etag else None, timeout=timeout,
+                              cancel=self._cancel, store=False,
+                              progress=lambda size: self.set_status(f"Downloading: {size / 1e6:.1f} MB"))
+        check_json_error(response, "Failed to render snapshot")
+        response.raise_for_status()
+        self.pixels = None
+        if response.status_code == 304:
+            return
+        self.etag = response.headers.get('ETag', '')
+        self.size = int(response.headers['X-Image-Width']), int(response.headers['X-Image-Height'])
+        samples = np.frombuffer(response.content, dtype=np.uint8)
+        if len(samples) != self.size[0] * self.size[1] * 4:
+            raise ValueError("Truncated snapshot from QGIS server")
+        self.pixels = pixel_buffer(len(samples))
+        np.multiply(samples, np.float32(1 / 255), out=self.pixels)
+
+    def build(self, context):
+        if self.pixels is None:
+            # QGIS would render the same image
+            bpy_image = bpy.data.images[SNAPSHOT_IMAGE]
         else:
-            mat = bpy.data.materials.new(name=mat_name)
-            mat.use_nodes = True
-
-        # Set up the material nodes
-        nodes = mat.node_tree.nodes
+            bpy_image = snapshot_image(*self.size)
+            bpy_image.pixels.foreach_set(self.pixels)
+            bpy_image.update()
+            bpy_image[SNAPSHOT_ETAG] = self.etag
+
+        assign_extent_material(snapshot_material(bpy_image))
+        redraw_views(context)
+
+        self.report({'INFO'}, "QGIS snapshot updated" if self.pixels is not None else "QGIS snapshot unchanged")
+
+
+# Float pixels of the latest snapshot, kept between updates so that refreshing allocates nothing new
+snapshot_pixels = np.empty(0, dtype=np.float32)
+
+
+def pixel_buffer(size):
+    global snapshot_pixels
+    if len(snapshot_pixels) != size:
+        snapshot_pixels = np.empty(size, dtype=np.float32)
+    return snapshot_pixels
+
+
+def snapshot_image(width, height):
+    # Reuse the snapshot image, resizing it only when the snapshot size changes
+    bpy_image = bpy.data.images.get(SNAPSHOT_IMAGE)
+    if bpy_image and bpy_image.source != 'GENERATED' and not bpy_image.get(PACKED_SNAPSHOT):
+        # Snapshots of earlier versions were packed PNG files; only the ones packed on save are reused
+        bpy.data.images.remove(bpy_image)
+        bpy_image = None
+    if bpy_image is None:
+        bpy_image = bpy.data.images.new(SNAPSHOT_IMAGE, width=width, height=height, alpha=True)
+    elif tuple(bpy_image.size) != (width, height):
+        bpy_image.scale(width, height)
+    return bpy_image
+
+
+def snapshot_material(bpy_image):
+    # The node tree is built once; later updates only point its texture node at the image
+    mat = bpy.data.materials.get(SNAPSHOT_MATERIAL)
+    if mat is None:
+        mat = bpy.data.materials.new(name=SNAPSHOT_MATERIAL)
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    tex_node = nodes.get(SNAPSHOT_IMAGE)
+    if tex_node is None:
         links = mat.node_tree.links
         nodes.clear()
-
         tex_node = nodes.new(type='ShaderNodeTexImage')
-        tex_node.image = bpy_image
-
+        tex_node.name = SNAPSHOT_IMAGE
         bsdf_node = nodes.new(type='ShaderNodeBsdfPrincipled')
         output_node = nodes.new(type='ShaderNodeOutputMaterial')
-
         links.new(tex_node.outputs['Color'], bsdf_node.inputs['Base Color'])
         links.new(bsdf_node.outputs['BSDF'], output_node.inputs['Surface'])
+    if tex_node.image != bpy_image:
+        tex_node.image = bpy_image
+    return mat
+
+
+def assign_extent_material(mat):
+    # Assign the material to the QGIS extent rectangle
+    rect = bpy.data.objects.get("qgis_extent")
+    if rect:
+        if len(rect.data.materials) == 0:
+            rect.data.materials.append(mat)
+        elif rect.data.materials[0] != mat:
+            rect.data.materials[0] = mat
+
 
-        # Assign the material to the QGIS extent rectangle
-        rect = bpy.data.objects.get("qgis_extent")
-        if rect:
-            if len(rect.data.materials) == 0:
-                rect.data.materials.append(mat)
-            else:
-                rect.data.materials[0] = mat
+def redraw_views(context):
+    for area in context.screen.areas if context.screen else ():
+        if area.type == 'VIEW_3D':
+            area.tag_redraw()
 
-        # Force update of the viewport
-        bpy.ops.wm.redraw_timer(type='DRAW_WIN_SWAP', iterations=1)
 
-        self.report({'INFO'}, "QGIS snapshot updated")
-        return {'FINISHED'}
+@persistent
+def pack_snapshot(*args):
+    # The snapshot only lives in memory between updates; pack it when the file is saved
+    bpy_image = bpy.data.images.get(SNAPSHOT_IMAGE)
+    if bpy_image and bpy_image.is_dirty:
+        bpy_image.pack()
+        bpy_image[PACKED_SNAPSHOT] = True
 
 
 def register():
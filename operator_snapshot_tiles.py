@@ -0,0 +1,171 @@
+import glob
+import json
+import os
+from concurrent.futures import as_completed
+
+import bpy
+from bpy.types import Operator
+
+from .cache import cached_get, payload_cache
+from .client import check_json_error, executor
+from .modal import BackgroundOperator
+from .operator_snapshot import assign_extent_material, redraw_views
+from .utils import tile_zoom, visible_extent_bbox
+
+TILES_IMAGE = "QGISTiles"
+TILES_MATERIAL = "QGISTilesMaterial"
+# A UDIM row holds 10 tiles, so at most 2^3 tiles per side
+UDIM_MAX_ZOOM = 3
+
+
+def udim_number(x, y):
+    return 1001 + x + 10 * y
+
+
+class QGIS_OT_update_tiles(BackgroundOperator, Operator):
+    bl_idname = "qgis.update_tiles"
+    bl_label = "Update Tiles"
+    bl_description = ("Texture the QGIS extent rectangle with map tiles at the resolution the camera needs, "
+                      "fetching only the tiles that changed")
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.qgis_linked
+
+    def prepare(self, context):
+        bbox = visible_extent_bbox(context)
+        if not bbox:
+            self.report({'ERROR'}, "qgis_extent object not found")
+            return False
+        xmin, ymin, xmax, ymax = map(float, bbox.split(','))
+        scene = context.scene
+        self.zoom = tile_zoom(context, max(xmax - xmin, ymax - ymin), scene.qgis_tile_size, UDIM_MAX_ZOOM)
+        # Blender reads UDIM tiles from files, kept next to the download cache
+        self.directory = os.path.join(payload_cache.directory or bpy.app.tempdir, 'tiles')
+        self.request = (scene.qgis_server_url, {'extent': bbox, 'size': scene.qgis_tile_size}, scene.qgis_timeout)
+        return True
+
+    def fetch(self):
+        server_url, params, timeout = self.request
+        tiles = 1 << self.zoom
+        os.makedirs(self.directory, exist_ok=True)
+
+        # The tile files on disk belong to one extent, zoom level and tile size; their ETags tell what to rewrite
+        manifest_path = os.path.join(self.directory, 'tiles.json')
+        key = json.dumps([server_url, self.zoom, sorted(params.items())])
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        if manifest.get('key') != key:
+            for path in glob.glob(os.path.join(self.directory, f'{TILES_IMAGE}.*.png')):
+                os.remove(path)
+            manifest = {'key': key, 'etags': {}}
+        etags = manifest['etags']
+
+        # The tile files are the only copy; tiles are revalidated with their ETag instead of being cached
+        self.set_status(f"Rendering {tiles * tiles} tiles in QGIS")
+        futures = {}
+        for y in range(tiles):
+            for x in range(tiles):
+                number = udim_number(x, y)
+                etag = etags.get(str(number)) if os.path.exists(self.tile_path(number)) else None
+                futures[executor.submit(cached_get, server_url, f'/tile/{self.zoom}/{x}/{y}.png', params=params,
+                                        headers={'If-None-Match': etag} if etag else None, timeout=timeout,
+                                        cancel=self._cancel, store=False)] = number
+        self.changed = 0
+        try:
+            for done, future in enumerate(as_completed(futures), 1):
+                response = future.result()
+                check_json_error(response, "Failed to render tile")
+                response.raise_for_status()
+                number = futures[future]
+                path = self.tile_path(number)
+                etag = response.headers.get('ETag', '')
+                if response.status_code != 304 and (not etag or etags.get(str(number)) != etag
+                                                    or not os.path.exists(path)):
+                    with open(path + '.tmp', 'wb') as f:
+                        f.write(response.content)
+                    os.replace(path + '.tmp', path)
+                    etags[str(number)] = etag
+                    self.changed += 1
+                self.set_status(f"Fetched {done} of {len(futures)} tiles")
+        finally:
+            for future in futures:
+                future.cancel()
+            with open(manifest_path, 'w') as f:
+                json.dump(manifest, f)
+        self.numbers = sorted(futures.values())
+
+    def tile_path(self, number):
+        return os.path.join(self.directory, f'{TILES_IMAGE}.{number}.png')
+
+    def build(self, context):
+        bpy_image = bpy.data.images.get(TILES_IMAGE)
+        reload = self.changed > 0
+        if bpy_image is None:
+            bpy_image = bpy.data.images.load(self.tile_path(1001), check_existing=False)
+            bpy_image.name = TILES_IMAGE
+            bpy_image.source = 'TILED'
+        filepath = self.tile_path('<UDIM>')
+        if bpy_image.filepath != filepath:
+            bpy_image.filepath = filepath
+            reload = True
+
+        # Only the tiles of the current zoom level
+        numbers = set(self.numbers)
+        for tile in list(bpy_image.tiles):
+            if tile.number not in numbers:
+                bpy_image.tiles.remove(tile)
+                reload = True
+        for number in sorted(numbers - {tile.number for tile in bpy_image.tiles}):
+            bpy_image.tiles.new(tile_number=number)
+            reload = True
+        if reload:
+            bpy_image.reload()
+
+        assign_extent_material(tiles_material(bpy_image, 1 << self.zoom))
+        redraw_views(context)
+        self.report({'INFO'}, f"Updated {self.changed} of {len(self.numbers)} tiles at zoom level {self.zoom}")
+
+
+def tiles_material(bpy_image, tiles):
+    # The node tree is built once; the mapping spreads the extent's 0..1 UVs over the tiles per side
+    mat = bpy.data.materials.get(TILES_MATERIAL)
+    if mat is None:
+        mat = bpy.data.materials.new(name=TILES_MATERIAL)
+    mat.use_nodes = True
+    nodes = mat.node_tree.nodes
+    tex_node = nodes.get(TILES_IMAGE)
+    mapping_node = nodes.get("Mapping")
+    if tex_node is None or mapping_node is None:
+        links = mat.node_tree.links
+        nodes.clear()
+        coord_node = nodes.new(type='ShaderNodeTexCoord')
+        mapping_node = nodes.new(type='ShaderNodeMapping')
+        mapping_node.name = "Mapping"
+        tex_node = nodes.new(type='ShaderNodeTexImage')
+        tex_node.name = TILES_IMAGE
+        bsdf_node = nodes.new(type='ShaderNodeBsdfPrincipled')
+        output_node = nodes.new(type='ShaderNodeOutputMaterial')
+        links.new(coord_node.outputs['UV'], mapping_node.inputs['Vector'])
+        links.new(mapping_node.outputs['Vector'], tex_node.inputs['Vector'])
+        links.new(tex_node.outputs['Color'], bsdf_node.inputs['Base Color'])
+        links.new(bsdf_node.outputs['BSDF'], output_node.inputs['Surface'])
+    if tex_node.image != bpy_image:
+        tex_node.image = bpy_image
+    mapping_node.inputs['Scale'].default_value = (tiles, tiles, 1.0)
+    return mat
+
+
+def register():
+    bpy.utils.register_class(QGIS_OT_update_tiles)
+
+
+def unregister():
+    bpy.utils.unregister_class(QGIS_OT_update_tiles)
+
+
+if __name__ == "__main__":
+    register()
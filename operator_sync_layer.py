@@ -0,0 +1,161 @@
+import bpy
+import numpy as np
+from bpy.props import StringProperty
+from .cache import cached_get
+from .client import QGISServerError, check_json_error, executor, qgis_get, read_body
+from .layer_data import decode_layer_data
+from .operator_import_layer import QGIS_OT_import_layer
+from .utils import feature_codes, fid_table, fids_fit, merge_attribute_lookups, patch_mesh, store_fid_table
+
+
+class QGIS_OT_sync_layer(QGIS_OT_import_layer):
+    bl_idname = "qgis.sync_layer"
+    bl_label = "Update"
+    bl_description = "Apply the features edited in QGIS since the last import, leaving the rest untouched"
+
+    layer_id: StringProperty()
+
+    # Layers being updated, so that changes announced meanwhile wait for the update to finish
+    running = set()
+
+    def prepare(self, context):
+        layer = self.find_layer(context)
+        if not layer:
+            self.report({'ERROR'}, "Layer not found")
+            return False
+        if self.layer_id in self.running:
+            self.report({'INFO'}, f"{layer.name} is already being updated")
+            return False
+        params = self.request_params(context, layer)
+        if params is None:
+            return False
+        if (not layer.server_session or layer.import_settings != self.import_settings(context, layer, params)
+                or not bpy.data.collections.get(layer.name)):
+            self.report({'WARNING'}, f"{layer.name} needs a full import first")
+            return False
+
+        self.settings = self.import_settings(context, layer, params)
+        params.update(since=str(layer.revision), session=layer.server_session)
+        self.request = (context.scene.qgis_server_url, f'/layer/{self.layer_id}/changes', params, {})
+        self.style_path = f'/layerstyle/{self.layer_id}'
+        self.timeout = context.scene.qgis_timeout
+        self.layer_name = layer.name
+        self.collection_name = None
+        self.running.add(self.layer_id)
+        return True
+
+    def fetch(self):
+        server_url, path, params, headers = self.request
+        self.set_status(f"Requesting changes to {self.layer_name}")
+        style = executor.submit(cached_get, server_url, self.style_path, timeout=self.timeout)
+        response = qgis_get(server_url, path, params=params, headers=headers, timeout=self.timeout, stream=True)
+        check_json_error(response, f"Failed to export {self.layer_name}")
+        response.raise_for_status()
+        self.layer_data = decode_layer_data(read_body(response, self._cancel))
+        self.columns = self.layer_data.attribute_columns()
+        style_data = style.result().json()
+        self.fill_color_rgba = self.hex_to_rgba(style_data.get('color', '#ffffff'))
+
+    def cleanup(self, context):
+        # Only the scratch collection of new features is ever partial
+        self.running.discard(self.layer_id)
+        if self.collection_name:
+            self.remove_scratch(bpy.data.collections.get(self.collection_name))
+
+    def build(self, context):
+        yield from self.apply_changes(context)
+        self.running.discard(self.layer_id)
+
+    def apply_changes(self, context):
+        layer = self.find_layer(context)
+        layer_collection = bpy.data.collections.get(layer.name) if layer else None
+        if not layer_collection:
+            raise QGISServerError("Layer not found")
+        header = self.layer_data.header
+        # Ids beyond 32 bits arriving in a layer whose feature_id attributes hold the ids themselves
+        # need the whole layer re-encoded
+        fid_overflow = fid_table(layer_collection) is None and not fids_fit(self.layer_data.feature_ids)
+        if header['reset'] or fid_overflow:
+            self.report({'WARNING'}, f"{layer.name} changed beyond what can be updated, importing it again")
+            self.running.discard(self.layer_id)
+            bpy.ops.qgis.import_layer('INVOKE_DEFAULT', layer_id=self.layer_id)
+            return
+
+        # Everything added, changed or deleted is dropped; the current state of the first two is rebuilt
+        stale = set(header['deleted']) | {int(fid) for fid in self.layer_data.feature_ids}
+        codes = self.remove_features(layer_collection, stale)
+        merged = next((obj for obj in layer_collection.objects if self.is_merged(obj)), None)
+        delta = None
+
+        if self.layer_data.feature_count:
+            # Built aside in a scratch collection, then moved over or merged into the layer's merged mesh
+            scratch = bpy.data.collections.new(f"{layer.name}.update")
+            self.collection_name = scratch.name
+            columns = merge_attribute_lookups(layer_collection, self.columns)
+            table = fid_table(layer_collection)
+            if table is not None:
+                store_fid_table(scratch, table)
+            yield from self.import_features(context, layer, self.layer_data, columns, scratch, self.fill_color_rgba)
+            for obj in list(scratch.objects):
+                if merged and self.is_merged(obj):
+                    delta = obj.data
+                else:
+                    layer_collection.objects.link(obj)
+                    scratch.objects.unlink(obj)
+            # New features extended the scratch copy of the fid table
+            if table is not None:
+                store_fid_table(layer_collection, fid_table(scratch))
+
+        # The merged mesh drops its stale elements and takes the rebuilt ones in a single pass
+        if merged and (len(codes) or delta is not None):
+            patch_mesh(merged.data, codes, delta)
+        if self.collection_name:
+            self.remove_scratch(bpy.data.collections.get(self.collection_name))
+            self.collection_name = None
+
+        layer.etag = header['etag']
+        layer.revision = header['revision']
+        self.report({'INFO'}, f"Updated {self.layer_data.feature_count} and removed "
+                              f"{len(header['deleted'])} features of {layer.name}")
+
+    def is_merged(self, obj):
+        # Objects holding a whole layer rather than a single feature
+        return "qgis_fid" not in obj and obj.type == 'MESH' and "feature_id" in obj.data.attributes
+
+    def remove_features(self, layer_collection, fids):
+        # Objects of single features through the qgis_fid index; returns the feature_id codes of the
+        # fids for the elements of merged meshes
+        index = {}
+        fids = np.fromiter(fids, dtype=np.int64)
+        if fid_table(layer_collection) is None:
+            # Ids beyond 32 bits were never imported into a layer without a fid table
+            int32 = np.iinfo(np.int32)
+            fids = fids[(fids >= int32.min) & (fids <= int32.max)]
+        codes = feature_codes(layer_collection, fids)
+        codes = codes[codes != -1]
+        for obj in layer_collection.objects:
+            if "qgis_fid" in obj:
+                index.setdefault(int(obj["qgis_fid"]), []).append(obj)
+        objects = [obj for fid in fids.tolist() for obj in index.get(fid, ())]
+        data = {obj.data for obj in objects if obj.data is not None and obj.data.users == 1}
+        if objects:
+            bpy.data.batch_remove(objects + list(data))
+        return codes
+
+    def remove_scratch(self, scratch):
+        if scratch:
+            objects = set(scratch.objects)
+            data = {obj.data for obj in objects if obj.data is not None and obj.data.users == 1}
+            bpy.data.batch_remove(objects | data | {scratch})
+
+
+def register():
+    bpy.utils.register_class(QGIS_OT_sync_layer)
+
+
+def unregister():
+    bpy.utils.unregister_class(QGIS_OT_sync_layer)
+
+
+if __name__ == "__main__":
+    register()
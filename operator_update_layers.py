@@ -13,7 +13,7 @@ class QGIS_OT_update_layers(Operator):
     bl_description = "Refresh the list of layers from QGIS"
 
     def execute(self, context):
-        bpy.ops.qgis.connect()
+        bpy.ops.qgis.connect('INVOKE_DEFAULT')
         return {'FINISHED'}
 
 def register():
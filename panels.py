@@ -1,9 +1,14 @@
 import bpy
 from bpy.types import Panel
+from .client import request_timings
 from .operator_connect import QGIS_OT_connect
 from .operator_update_layers import QGIS_OT_update_layers
 from .operator_import_layer import QGIS_OT_import_layer
+from .operator_import_layers import QGIS_OT_import_layers
+from .operator_remove_layer import QGIS_OT_remove_layer
+from .operator_sync_layer import QGIS_OT_sync_layer
 from .operator_snapshot import QGIS_OT_update_snapshot
+from .operator_snapshot_tiles import QGIS_OT_update_tiles
 from .operator_displacement_map import QGIS_OT_displacement_map
 
 
@@ -26,6 +31,7 @@ class QGIS_PT_import_panel(Panel):
 
         # Add a property field for the QGIS server URL
         layout.prop(context.scene, "qgis_server_url")
+        layout.prop(context.scene, "qgis_timeout")
 
         # Check if the QGIS connection is active
         if context.scene.qgis_linked:
@@ -48,12 +54,31 @@ class QGIS_PT_import_panel(Panel):
                     project_box.row().label(text=f"Map Canvas (px): {proj.canvas_width}, {proj.canvas_height}")
             layout.separator()
             layout.operator(QGIS_OT_update_layers.bl_idname, text="Update Layers")
+            # Download several layers at once, building each as soon as it arrives
+            import_row = layout.row(align=True)
+            import_row.operator(QGIS_OT_import_layers.bl_idname, text="Import Selected").all_layers = False
+            import_row.operator(QGIS_OT_import_layers.bl_idname, text="Import All").all_layers = True
+            layout.prop(context.scene, "qgis_live")
             layout.separator()
-            layout.operator(QGIS_OT_update_snapshot.bl_idname, text="Update from canvas")
+            layout.prop(context.scene, "qgis_snapshot_tiled")
+            if context.scene.qgis_snapshot_tiled:
+                layout.prop(context.scene, "qgis_tile_size")
+                layout.operator(QGIS_OT_update_tiles.bl_idname, text="Update tiles from canvas")
+            else:
+                layout.prop(context.scene, "qgis_snapshot_size")
+                layout.operator(QGIS_OT_update_snapshot.bl_idname, text="Update from canvas")
         else:
             # If not linked, display the "Link" button to establish the connection
             layout.operator(QGIS_OT_connect.bl_idname, text="Link")
 
+        # Time to response headers of the latest requests, for diagnosing a slow link
+        layout.prop(context.scene, "qgis_show_timings")
+        if context.scene.qgis_show_timings:
+            timings_box = layout.box()
+            for path, status, milliseconds, size in reversed(list(request_timings)):
+                size_text = f", {int(size) / 1024:.0f} KiB" if size else ""
+                timings_box.label(text=f"{path}: {status} in {milliseconds:.0f} ms{size_text}")
+
         # Add a separator line for better UI organization
         layout.separator()
 
@@ -66,13 +91,22 @@ class QGIS_PT_import_panel(Panel):
             # Add a property to expand/collapse layer details with an arrow icon
             row.prop(layer, "is_expanded", icon="TRIA_DOWN" if layer.is_expanded else "TRIA_RIGHT", icon_only=True,
                      emboss=False)
+            # Add a checkbox to pick the layer for Import Selected, except for rasters/displacement
+            if layer.type.lower() not in ["raster", "displacement"]:
+                row.prop(layer, "selected", text="")
             # Display the layer's name
             row.label(text=layer.name)
             # Add an "Import" button for each layer except rasters/displacement
             if layer.type.lower() not in ["raster", "displacement"]:
                 row.operator(QGIS_OT_import_layer.bl_idname, text="Import").layer_id = layer.layer_id
+                # Offer to remove layers that have been imported
+                if layer.name in bpy.data.collections:
+                    if layer.server_session:
+                        row.operator(QGIS_OT_sync_layer.bl_idname, text="", icon='FILE_REFRESH').layer_id = \
+                            layer.layer_id
+                    row.operator(QGIS_OT_remove_layer.bl_idname, text="", icon='TRASH').layer_id = layer.layer_id
             if layer.type.lower() == "displacement":
-                row.operator(QGIS_OT_displacement_map.bl_idname, text="Displace").layer_id = layer.layer_id
+                row.operator(QGIS_OT_displacement_map.bl_idname, text="Terrain").layer_id = layer.layer_id
 
             # If the layer is expanded, show additional details
             if layer.is_expanded:
@@ -80,12 +114,30 @@ class QGIS_PT_import_panel(Panel):
                 box.label(text=f"Type: {layer.type}")
                 # Display the feature count of the layer
                 box.label(text=f"Feature count: {layer.feature_count}")
+                if layer.type.lower() not in ["raster", "displacement"]:
+                    box.prop(layer, "visible_extent_only")
+                    box.prop(layer, "fields")
+                    box.prop(layer, "attribute_storage")
+                    if layer.type.lower() != "point":
+                        box.prop(layer, "simplify")
+                # Sampling of the terrain built from displacement layers
+                if layer.type.lower() == "displacement":
+                    box.prop(context.scene, "qgis_terrain_vertices")
+                    box.prop(context.scene, "qgis_terrain_resolution")
+                    box.prop(context.scene, "qgis_terrain_tolerance")
+                if "linestring" in layer.type.lower() or "polygon" in layer.type.lower():
+                    box.prop(layer, "single_object")
                 # If the layer type is "Point", provide additional options for importing as spheres
                 if layer.type.lower() == "point":
                     # Add a checkbox for making spheres
                     box.prop(layer, "make_spheres")
+                    if not layer.make_spheres:
+                        box.prop(layer, "single_object")
                     # If making spheres, provide additional properties to configure sphere geometry
                     if layer.make_spheres:
+                        box.prop(layer, "instance_spheres")
                         box.prop(layer, "sphere_radius")
                         box.prop(layer, "sphere_u_segments")
                         box.prop(layer, "sphere_v_segments")
+                        if layer.instance_spheres:
+                            box.prop(layer, "sphere_scale_field")
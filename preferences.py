@@ -0,0 +1,83 @@
+import os
+
+import bpy
+from bpy.props import BoolProperty, IntProperty, StringProperty
+from bpy.types import AddonPreferences, Operator
+
+from .cache import payload_cache
+
+
+def cache_directory(preferences):
+    return bpy.path.abspath(preferences.cache_dir) or os.path.join(bpy.utils.user_resource('CONFIG'),
+                                                                   'qgis_blenderlink_cache')
+
+
+def configure_cache(preferences, context=None):
+    # Also the update callback of every cache setting
+    payload_cache.configure(preferences.use_cache, cache_directory(preferences),
+                            preferences.cache_size_mb * 1024 * 1024, preferences.offline)
+
+
+class QGISBlenderLinkPreferences(AddonPreferences):
+    bl_idname = __package__
+
+    use_cache: BoolProperty(
+        name="Cache downloads",
+        description="Keep layer, style, snapshot and raster downloads on disk and revalidate them with QGIS",
+        default=True,
+        update=configure_cache,
+    )
+    cache_dir: StringProperty(
+        name="Cache folder",
+        description="Where downloads are cached (empty uses the Blender configuration folder)",
+        subtype='DIR_PATH',
+        default="",
+        update=configure_cache,
+    )
+    cache_size_mb: IntProperty(
+        name="Cache size (MB)",
+        description="Least recently used downloads are dropped beyond this size",
+        default=2048,
+        min=16,
+        update=configure_cache,
+    )
+    offline: BoolProperty(
+        name="Use cache when QGIS is offline",
+        description="Rebuild layers from cached downloads when the QGIS server cannot be reached",
+        default=True,
+        update=configure_cache,
+    )
+
+    def draw(self, context):
+        layout = self.layout
+        layout.prop(self, "use_cache")
+        column = layout.column()
+        column.enabled = self.use_cache
+        column.prop(self, "cache_dir")
+        column.prop(self, "cache_size_mb")
+        column.prop(self, "offline")
+        row = column.row()
+        row.label(text=f"{payload_cache.size() / (1024 * 1024):.1f} MB in {cache_directory(self)}")
+        row.operator(QGIS_OT_clear_cache.bl_idname)
+
+
+class QGIS_OT_clear_cache(Operator):
+    bl_idname = "qgis.clear_cache"
+    bl_label = "Clear cache"
+    bl_description = "Delete every cached QGIS download"
+
+    def execute(self, context):
+        payload_cache.clear()
+        self.report({'INFO'}, "QGIS download cache cleared")
+        return {'FINISHED'}
+
+
+def register():
+    bpy.utils.register_class(QGISBlenderLinkPreferences)
+    bpy.utils.register_class(QGIS_OT_clear_cache)
+    configure_cache(bpy.context.preferences.addons[__package__].preferences)
+
+
+def unregister():
+    bpy.utils.unregister_class(QGIS_OT_clear_cache)
+    bpy.utils.unregister_class(QGISBlenderLinkPreferences)
@@ -1,5 +1,5 @@
 import bpy
-from bpy.props import StringProperty, BoolProperty, FloatProperty, IntProperty
+from bpy.props import StringProperty, BoolProperty, EnumProperty, FloatProperty, IntProperty
 from bpy.types import PropertyGroup
 
 class QGISLayerProperties(PropertyGroup):
@@ -12,6 +12,21 @@ class QGISLayerProperties(PropertyGroup):
         description="Import points as spheres",
         default=False,
     )
+    single_object: BoolProperty(
+        name="Single object",
+        description="Build the whole layer as one object instead of one object per feature",
+        default=False,
+    )
+    instance_spheres: BoolProperty(
+        name="Instanced",
+        description="Instance one shared sphere on the points with Geometry Nodes instead of one mesh per point",
+        default=False,
+    )
+    sphere_scale_field: StringProperty(
+        name="Scale field",
+        description="Numeric attribute scaling each instanced sphere (empty for uniform spheres)",
+        default="",
+    )
     sphere_radius: FloatProperty(
         name="Sphere radius",
         description="Radius of the spheres",
@@ -31,6 +46,41 @@ class QGISLayerProperties(PropertyGroup):
         min=6,
         max=20
     )
+    visible_extent_only: BoolProperty(
+        name="Visible extent only",
+        description="Only import features inside the qgis_extent rectangle",
+        default=False,
+    )
+    fields: StringProperty(
+        name="Fields",
+        description="Comma separated attribute fields to import (empty imports all fields)",
+        default="",
+    )
+    attribute_storage: EnumProperty(
+        name="Attributes",
+        description="Where the field values of features imported as separate objects are stored",
+        items=[
+            ('PROPERTIES', "Custom properties", "One custom property per field on every object"),
+            ('GEOMETRY', "Geometry attributes",
+             "Typed mesh attributes readable from shaders and Geometry Nodes; strings are indices into a "
+             "<field>_lookup list on the layer collection. Line curves keep custom properties"),
+        ],
+        default='PROPERTIES',
+    )
+    simplify: BoolProperty(
+        name="Simplify to render resolution",
+        description="Drop vertices closer together than a pixel of the render resolution over the QGIS canvas",
+        default=False,
+    )
+    selected: BoolProperty(
+        name="Selected",
+        description="Include the layer in Import Selected",
+        default=False,
+    )
+    etag: StringProperty(name="ETag", description="ETag of the last imported layer data")
+    revision: IntProperty(name="Revision", description="QGIS layer revision the imported objects reflect")
+    server_session: StringProperty(name="Server Session", description="QGIS server session of the revision")
+    import_settings: StringProperty(name="Import Settings", description="Settings of the last import")
     is_expanded: BoolProperty(default=True)
 
 
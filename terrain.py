@@ -0,0 +1,105 @@
+import math
+
+import numpy as np
+
+
+def grid_shape(width, height, max_vertices, resolution=0.0):
+    """Columns and rows of vertices covering a width x height extent.
+
+    Vertices are ``resolution`` map units apart, or spread evenly over ``max_vertices`` when
+    resolution is 0; the budget caps the grid either way.
+    """
+    if resolution > 0:
+        columns, rows = math.ceil(width / resolution) + 1, math.ceil(height / resolution) + 1
+    else:
+        columns, rows = math.inf, math.inf
+    if columns * rows > max_vertices:
+        columns = math.sqrt(max_vertices * width / height)
+        rows = max_vertices / columns
+    return max(2, int(columns)), max(2, int(rows))
+
+
+def regular_faces(rows, columns):
+    """One quad per grid cell over vertices numbered row by row, as face sizes and loop vertices."""
+    corners = (np.arange(rows - 1)[:, None] * columns + np.arange(columns - 1)).ravel()
+    loops = np.column_stack((corners, corners + 1, corners + columns + 1, corners + columns))
+    return np.full(len(corners), 4, dtype=np.int32), loops.ravel()
+
+
+def adaptive_faces(heights, tolerance):
+    """Quadtree faces that follow the heights to within tolerance, over vertices numbered row by row.
+
+    A block of cells becomes one face once bilinear interpolation between its corners is within
+    tolerance of every sample it covers. Faces take every used vertex along their edges, so
+    neighbouring blocks of different sizes share their edges without cracks.
+    """
+    rows, columns = heights.shape
+    leaves = []
+    blocks = [(0, 0, columns - 1, rows - 1)]
+    while blocks:
+        x0, y0, x1, y1 = blocks.pop()
+        samples = heights[y0:y1 + 1, x0:x1 + 1]
+        u = np.linspace(0.0, 1.0, x1 - x0 + 1)
+        v = np.linspace(0.0, 1.0, y1 - y0 + 1)[:, None]
+        bottom = samples[0, 0] + (samples[0, -1] - samples[0, 0]) * u
+        top = samples[-1, 0] + (samples[-1, -1] - samples[-1, 0]) * u
+        if (x1 - x0 <= 1 and y1 - y0 <= 1) or np.abs(samples - (bottom + (top - bottom) * v)).max() <= tolerance:
+            leaves.append((x0, y0, x1, y1))
+            continue
+        # Split across the longer side only for narrow blocks, so faces stay roughly square
+        xm, ym = (x0 + x1) // 2, (y0 + y1) // 2
+        xs = ((x0, xm), (xm, x1)) if x1 - x0 > 1 and x1 - x0 >= (y1 - y0) / 2 else ((x0, x1),)
+        ys = ((y0, ym), (ym, y1)) if y1 - y0 > 1 and y1 - y0 >= (x1 - x0) / 2 else ((y0, y1),)
+        blocks.extend((bx0, by0, bx1, by1) for bx0, bx1 in xs for by0, by1 in ys)
+
+    used = np.zeros(heights.shape, dtype=bool)
+    for x0, y0, x1, y1 in leaves:
+        used[(y0, y0, y1, y1), (x0, x1, x1, x0)] = True
+
+    # Counter-clockwise around each block: along the bottom, up the right, back along the top, down the left
+    face_sizes = np.empty(len(leaves), dtype=np.int32)
+    loops = []
+    for i, (x0, y0, x1, y1) in enumerate(leaves):
+        bottom = y0 * columns + x0 + np.flatnonzero(used[y0, x0:x1])
+        right = (y0 + np.flatnonzero(used[y0:y1, x1])) * columns + x1
+        top = y1 * columns + x1 - np.flatnonzero(used[y1, x1:x0:-1])
+        left = (y1 - np.flatnonzero(used[y1:y0:-1, x0])) * columns + x0
+        face = np.concatenate((bottom, right, top, left))
+        face_sizes[i] = len(face)
+        loops.append(face)
+    return face_sizes, np.concatenate(loops)
+
+
+def heightfield(heights, bounds, scale=1.0, tolerance=0.0):
+    """Vertices, UVs, face sizes and loop vertices of a terrain mesh from a raster grid.
+
+    ``heights`` is a (rows, columns) grid listed from the top row down, as read from /raster;
+    its samples are spread over ``bounds`` (xmin, ymin, xmax, ymax), the outer ones on its edges,
+    with their height above the lowest valid sample times ``scale`` as Z. /raster samples cell
+    centres, so the grid is read over bounds grown by half a cell. No-data samples sit at the
+    lowest height.
+    Only vertices used by a face are returned; UVs run from 0 to 1 over the bounds.
+    """
+    heights = np.asarray(heights, dtype=np.float64)[::-1]
+    valid = ~np.isnan(heights)
+    base = heights[valid].min() if valid.any() else 0.0
+    heights = np.where(valid, heights - base, 0.0) * scale
+    rows, columns = heights.shape
+
+    if tolerance > 0:
+        face_sizes, loop_vertices = adaptive_faces(heights, tolerance)
+    else:
+        face_sizes, loop_vertices = regular_faces(rows, columns)
+
+    # Drop the vertices no face uses and renumber the loops
+    used = np.zeros(rows * columns, dtype=bool)
+    used[loop_vertices] = True
+    remap = np.cumsum(used, dtype=np.int64) - 1
+    indices = np.flatnonzero(used)
+    row, column = np.divmod(indices, columns)
+
+    u = column / (columns - 1)
+    v = row / (rows - 1)
+    xmin, ymin, xmax, ymax = bounds
+    vertices = np.column_stack((xmin + u * (xmax - xmin), ymin + v * (ymax - ymin), heights.ravel()[indices]))
+    return vertices, np.column_stack((u, v)), face_sizes, remap[loop_vertices]
@@ -1,20 +1,308 @@
+import bpy
+import math
+import numpy as np
 import requests
+from mathutils import Vector
 from functools import wraps
+from .client import QGISServerError
+
+def error_message(e):
+    if isinstance(e, QGISServerError):
+        return str(e)
+    if isinstance(e, requests.RequestException):
+        return f"Failed to connect to QGIS server: {str(e)}"
+    if isinstance(e, ValueError):
+        return f"Failed to parse server response: {str(e)}"
+    return f"An unexpected error occurred: {str(e)}"
 
 def error_handler(func):
     @wraps(func)
     def wrapper(self, context):
         try:
             return func(self, context)
-        except requests.RequestException as e:
-            self.report({'ERROR'}, f"Failed to connect to QGIS server: {str(e)}")
-        except ValueError as e:
-            self.report({'ERROR'}, f"Failed to parse server response: {str(e)}")
         except Exception as e:
-            self.report({'ERROR'}, f"An unexpected error occurred: {str(e)}")
+            self.report({'ERROR'}, error_message(e))
         return {'CANCELLED'}
     return wrapper
 
 def add_custom_properties(obj, attributes):
     for attr_name, attr_value in attributes.items():
         obj[attr_name] = attr_value
+
+
+def fill_mesh(mesh, vertices, face_sizes=None, edges=None, loop_vertices=None):
+    # Bulk-fill an empty mesh; faces take face_sizes[i] consecutive entries of loop_vertices,
+    # which defaults to the vertices in order
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set('co', np.asarray(vertices, dtype=np.float32).ravel())
+    if edges is not None and len(edges):
+        mesh.edges.add(len(edges))
+        mesh.edges.foreach_set('vertices', np.asarray(edges, dtype=np.int32).ravel())
+    if face_sizes is not None and len(face_sizes):
+        face_sizes = np.asarray(face_sizes, dtype=np.int32)
+        mesh.loops.add(int(face_sizes.sum()))
+        if loop_vertices is None:
+            loop_vertices = np.arange(len(mesh.loops))
+        mesh.loops.foreach_set('vertex_index', np.asarray(loop_vertices, dtype=np.int32))
+        mesh.polygons.add(len(face_sizes))
+        mesh.polygons.foreach_set('loop_start', np.cumsum(face_sizes, dtype=np.int32) - face_sizes)
+    mesh.update(calc_edges=face_sizes is not None)
+
+
+def fids_fit(feature_ids):
+    # Whether QGIS feature ids (int64) fit the int32 feature_id attribute as they are
+    feature_ids = np.asarray(feature_ids, dtype=np.int64)
+    int32 = np.iinfo(np.int32)
+    return not len(feature_ids) or (feature_ids.min() >= int32.min and feature_ids.max() <= int32.max)
+
+
+def fid_table(id_data):
+    # Feature ids of a layer whose ids do not fit int32, stored as the high and low words of each id;
+    # its feature_id attributes hold indices into the table. None when feature_id holds the ids themselves
+    if "qgis_fid_high" not in id_data:
+        return None
+    high = np.array(id_data["qgis_fid_high"], dtype=np.int64)
+    low = np.array(id_data["qgis_fid_low"], dtype=np.int64) & 0xFFFFFFFF
+    return (high << 32) | low
+
+
+def store_fid_table(id_data, table):
+    table = np.asarray(table, dtype=np.int64)
+    id_data["qgis_fid_high"] = (table >> 32).astype(np.int32).tolist()
+    id_data["qgis_fid_low"] = (table & 0xFFFFFFFF).astype(np.uint32).view(np.int32).tolist()
+
+
+def feature_codes(id_data, feature_ids, extend=False):
+    # feature_id values of feature_ids: the ids, or their indices into the fid table of id_data, which
+    # extend adds missing ids to; ids that are not in the table map to -1
+    feature_ids = np.asarray(feature_ids, dtype=np.int64)
+    table = fid_table(id_data)
+    if table is None:
+        if not fids_fit(feature_ids):
+            raise ValueError("Feature ids do not fit the 32-bit feature_id attribute")
+        return feature_ids.astype(np.int32)
+    if extend:
+        missing = np.setdiff1d(feature_ids, table)
+        if len(missing):
+            table = np.concatenate((table, missing))
+            store_fid_table(id_data, table)
+    if not len(table):
+        return np.full(len(feature_ids), -1, dtype=np.int32)
+    order = np.argsort(table, kind='stable')
+    codes = order[np.searchsorted(table, feature_ids, sorter=order).clip(0, len(table) - 1)]
+    return np.where(table[codes] == feature_ids, codes, -1).astype(np.int32)
+
+
+def add_feature_ids(data, domain, feature_ids, id_data):
+    # feature_id ties every element of a merged mesh back to its QGIS feature, through the fid table of
+    # the layer collection id_data when the layer's ids do not fit int32
+    attribute = data.attributes.new("feature_id", 'INT', domain)
+    attribute.data.foreach_set('value', feature_codes(id_data, feature_ids, extend=True))
+
+
+def add_feature_attributes(data, domain, columns, element_features):
+    # LayerData.attribute_columns as typed attributes; element_features maps each element to its feature
+    for name, (attribute_type, values, _) in columns.items():
+        if name in data.attributes:
+            continue
+        attribute = data.attributes.new(name, attribute_type, domain)
+        attribute.data.foreach_set('value', values[element_features])
+
+
+def add_attribute_lookups(id_data, columns):
+    # String attributes hold indices into a <field>_lookup list stored as a custom property
+    for name, (_, _, lookup) in columns.items():
+        if lookup:
+            id_data[f"{name}_lookup"] = lookup
+
+
+def merge_attribute_lookups(id_data, columns):
+    # Re-encode string columns against the <field>_lookup lists already on id_data, extending them as needed
+    merged = {}
+    for name, (attribute_type, values, lookup) in columns.items():
+        if lookup is not None:
+            index = {label: i for i, label in enumerate(id_data.get(f"{name}_lookup", []))}
+            remap = np.array([index.setdefault(label, len(index)) for label in lookup], dtype=np.int32)
+            if len(remap):
+                values = np.where(values >= 0, remap[values], -1).astype(np.int32)
+            lookup = sorted(index, key=index.get)
+            if lookup:
+                id_data[f"{name}_lookup"] = lookup
+        merged[name] = (attribute_type, values, lookup)
+    return merged
+
+
+# foreach_get/foreach_set key, array dtype and values per element of each attribute type patch_mesh copies
+ATTRIBUTE_ARRAYS = {'FLOAT': ('value', np.float32, 1), 'INT': ('value', np.int32, 1), 'INT8': ('value', np.int32, 1),
+                    'BOOLEAN': ('value', bool, 1), 'FLOAT2': ('vector', np.float32, 2),
+                    'FLOAT_VECTOR': ('vector', np.float32, 3), 'FLOAT_COLOR': ('color', np.float32, 4),
+                    'BYTE_COLOR': ('color', np.float32, 4), 'INT32_2D': ('value', np.int32, 2),
+                    'QUATERNION': ('value', np.float32, 4)}
+
+
+def read_attribute(attribute):
+    key, dtype, width = ATTRIBUTE_ARRAYS[attribute.data_type]
+    values = np.empty(len(attribute.data) * width, dtype=dtype)
+    attribute.data.foreach_get(key, values)
+    return values.reshape(-1, width)
+
+
+def mesh_arrays(mesh):
+    # Vertex positions, edges, face sizes and face corners of a mesh, and its element count per domain
+    co = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get('co', co)
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get('vertices', edges)
+    face_sizes = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get('loop_total', face_sizes)
+    loops = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get('vertex_index', loops)
+    sizes = {'POINT': len(mesh.vertices), 'EDGE': len(mesh.edges), 'FACE': len(mesh.polygons),
+             'CORNER': len(mesh.loops)}
+    return co.reshape(-1, 3), edges.reshape(-1, 2), face_sizes, loops, sizes
+
+
+def patch_mesh(mesh, codes, delta_mesh):
+    # Replace the elements of a merged mesh whose feature_id is in codes (see feature_codes) with the
+    # elements of delta_mesh, in a single rebuild from masked arrays
+    attribute = mesh.attributes["feature_id"]
+    domain = attribute.domain
+    keep_elements = ~np.isin(read_attribute(attribute).ravel(), np.asarray(codes, dtype=np.int32))
+    co, edges, face_sizes, loops, sizes = mesh_arrays(mesh)
+
+    # Elements kept per domain; vertices go with the last element using them, loose vertices stay
+    keep = {domain: keep_elements}
+    if domain == 'FACE':
+        keep['CORNER'] = np.repeat(keep_elements, face_sizes)
+        users, kept_users = loops, loops[keep['CORNER']]
+    elif domain == 'EDGE':
+        users, kept_users = edges.ravel(), edges[keep_elements].ravel()
+    if domain == 'POINT':
+        keep['EDGE'] = keep_elements[edges].all(axis=1)
+    else:
+        keep['POINT'] = np.ones(len(co), dtype=bool)
+        keep['POINT'][users] = False
+        keep['POINT'][kept_users] = True
+    remap = np.cumsum(keep['POINT'], dtype=np.int64) - 1
+
+    if delta_mesh is not None:
+        delta_co, delta_edges, delta_face_sizes, delta_loops, delta_sizes = mesh_arrays(delta_mesh)
+    else:
+        delta_co, delta_edges, delta_face_sizes, delta_loops = (np.empty((0, 3)), np.empty((0, 2), dtype=np.int32),
+                                                                np.empty(0, dtype=np.int32),
+                                                                np.empty(0, dtype=np.int32))
+        delta_sizes = dict.fromkeys(sizes, 0)
+    base = int(keep['POINT'].sum())
+    co = np.concatenate((co[keep['POINT']], delta_co))
+    if domain == 'FACE':
+        # Edges are derived from the faces again
+        edges = None
+        face_sizes = np.concatenate((face_sizes[keep_elements], delta_face_sizes))
+        loops = np.concatenate((remap[loops[keep['CORNER']]], delta_loops.astype(np.int64) + base))
+    else:
+        edges = np.concatenate((remap[edges[keep['EDGE']]], delta_edges.astype(np.int64) + base))
+        face_sizes = loops = None
+
+    # Generic attributes of the kept elements followed by those of the delta, zeros where it has none
+    attributes = []
+    for attribute in mesh.attributes:
+        if (attribute.name == 'position' or attribute.name.startswith('.') or attribute.domain not in keep
+                or attribute.data_type not in ATTRIBUTE_ARRAYS):
+            continue
+        values = read_attribute(attribute)[keep[attribute.domain]]
+        delta_attribute = delta_mesh.attributes.get(attribute.name) if delta_mesh is not None else None
+        if (delta_attribute is not None and delta_attribute.data_type == attribute.data_type
+                and delta_attribute.domain == attribute.domain):
+            delta_values = read_attribute(delta_attribute)
+        else:
+            delta_values = np.zeros((delta_sizes[attribute.domain], values.shape[1]), dtype=values.dtype)
+        attributes.append((attribute.name, attribute.data_type, attribute.domain,
+                           np.concatenate((values, delta_values))))
+
+    mesh.clear_geometry()
+    fill_mesh(mesh, co, face_sizes, edges, loops)
+    for name, data_type, attribute_domain, values in attributes:
+        attribute = mesh.attributes.get(name) or mesh.attributes.new(name, data_type, attribute_domain)
+        attribute.data.foreach_set(ATTRIBUTE_ARRAYS[data_type][0], values.ravel())
+
+
+def remove_layer_collection(layer_name):
+    # Drop an imported layer with the objects, meshes, curves, node groups and materials it owned,
+    # in batch_remove calls instead of one delete operator (and undo push) per object
+    def owned(name, prefix):
+        return name == prefix or name.startswith(prefix + ".")
+
+    collection = bpy.data.collections.get(layer_name)
+    if collection:
+        collections = set(collection.children_recursive) | {collection}
+        # Objects the user also linked elsewhere are only unlinked from the layer
+        objects = set()
+        for obj in collection.all_objects:
+            if collections.issuperset(obj.users_collection):
+                objects.add(obj)
+            else:
+                for owner in collections.intersection(obj.users_collection):
+                    owner.objects.unlink(obj)
+        users = {}
+        for obj in objects:
+            if obj.data is not None:
+                users[obj.data] = users.get(obj.data, 0) + 1
+        data = {datablock for datablock, count in users.items() if datablock.users <= count}
+        bpy.data.batch_remove(objects | data | collections)
+
+    # Whatever is left unused under the layer's names, including leftovers from earlier imports; node
+    # groups go first, since the sphere instancer holds a user of the layer material
+    groups = [group for group in bpy.data.node_groups
+              if owned(group.name, f"{layer_name}_spheres") and group.users == 0]
+    if groups:
+        bpy.data.batch_remove(groups)
+    orphans = [datablock for datablock in bpy.data.materials if owned(datablock.name, f"{layer_name}_material")]
+    orphans += [datablock for datablocks in (bpy.data.meshes, bpy.data.curves) for datablock in datablocks
+                if datablock.name.startswith(f"{layer_name}.")]
+    orphans = [datablock for datablock in orphans if datablock.users == 0]
+    if orphans:
+        bpy.data.batch_remove(orphans)
+
+
+def snapshot_params(context):
+    # Render at qgis_snapshot_size pixels along the canvas' long edge, or at canvas size when it is 0
+    size = context.scene.qgis_snapshot_size
+    if not size or not context.scene.qgis_project:
+        return {}
+    project = context.scene.qgis_project[0]
+    return {'width': size} if project.canvas_width >= project.canvas_height else {'height': size}
+
+
+def visible_extent_bbox(context):
+    # Bounds of the qgis_extent rectangle in project coordinates, as a bbox query parameter
+    rect = bpy.data.objects.get("qgis_extent")
+    if not rect:
+        return None
+    corners = [rect.matrix_world @ Vector(corner) for corner in rect.bound_box]
+    offset = context.scene.qgis_offset
+    xs = [corner.x + offset[0] for corner in corners]
+    ys = [corner.y + offset[1] for corner in corners]
+    return f"{min(xs)},{min(ys)},{max(xs)},{max(ys)}"
+
+
+def tile_zoom(context, extent_size, tile_size, max_zoom):
+    # Lowest zoom level whose tiles give the scene camera at least one texel per rendered pixel
+    scene = context.scene
+    camera = scene.camera
+    if camera is None or camera.type != 'CAMERA':
+        return 0
+    render = scene.render
+    pixels = max(render.resolution_x, render.resolution_y) * render.resolution_percentage / 100
+    if camera.data.type == 'ORTHO':
+        visible = camera.data.ortho_scale
+    else:
+        # Width seen at the height of the extent rectangle, looking straight down
+        rect = bpy.data.objects.get("qgis_extent")
+        distance = camera.matrix_world.translation.z - (rect.matrix_world.translation.z if rect else 0.0)
+        visible = 2 * abs(distance) * math.tan(camera.data.angle / 2)
+    if visible <= 0:
+        return max_zoom
+    needed = extent_size * pixels / visible
+    if needed <= tile_size:
+        return 0
+    return min(max_zoom, math.ceil(math.log2(needed / tile_size)))